@@ -15,8 +15,11 @@ from Whittler.classes.Result import Result
 from Whittler.classes.input_utils import *
 from Whittler.classes.NestedObjectPointer import ObjectView
 from Whittler.classes.RelevanceFilteredResultList import RelevanceFilteredResultList
+from Whittler.classes.ParsedFileCache import ParsedFileCache
+from Whittler.classes.export_utils import give_export_header
 import importlib
 import importlib.machinery
+import itertools
 from pathlib import Path
 import datetime
 import argparse
@@ -32,6 +35,37 @@ except ImportError:
     IPYTHON_INSTALLED = False
 
 
+# Writes the chunks of bytes to a gzip-compressed file. With multiprocessing enabled, the chunks are gathered into blocks
+# that are compressed by the worker pool in parallel, each into a gzip member of its own (see WorkerPool.gzip_blocks).
+EXPORT_BLOCK_BYTES = 4*2**20
+def write_compressed_output(fname, chunks):
+    if not Config.MULTIPROCESSING:
+        with gzip.GzipFile(fname,"wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        return
+    def give_blocks():
+        block = []
+        block_size = 0
+        for chunk in chunks:
+            block.append(chunk)
+            block_size += len(chunk)
+            if block_size >= EXPORT_BLOCK_BYTES:
+                yield b"".join(block)
+                block = []
+                block_size = 0
+        if block:
+            yield b"".join(block)
+    with open(fname,"wb") as f:
+        written = False
+        for compressed_block in Config.WorkerPool.gzip_blocks(give_blocks()):
+            f.write(compressed_block)
+            written = True
+        if not written:
+            # Still a valid gzip file, just like the one GzipFile would write.
+            f.write(gzip.compress(b""))
+
+
 def main_loop(resultdb):
     global redirect_file, global_redirect_file, cached_commands
     current_view = None
@@ -74,6 +108,24 @@ def main_loop(resultdb):
             if verb == "help":
                 print_help()
                 continue
+            elif verb == "memstats":
+                stats = Config.InternTable.stats()
+                lookups = stats.hits + stats.misses
+                wprint(f"{stats.size} distinct attribute values interned in memory.")
+                wprint(f"{stats.hits} of {lookups} value lookups were shared with an existing value " + \
+                       "({:.1f}%).".format(100*stats.hits/lookups if lookups else 0))
+                if stats.collisions:
+                    wprint(f"{stats.collisions} lookups collided with a different value.")
+                if stats.evictions:
+                    wprint(f"{stats.evictions} values were evicted from the intern table.")
+                if Config.MEMORY_COMPRESSION:
+                    stats = Config.DecompressionCache.stats()
+                    lookups = stats.hits + stats.misses
+                    wprint(f"{stats.size} decompressed values cached ({stats.bytes} of {stats.max_bytes} bytes).")
+                    wprint(f"{stats.hits} of {lookups} reads of compressed values were served from the cache " + \
+                           "({:.1f}%).".format(100*stats.hits/lookups if lookups else 0))
+                wprint()
+                continue
             elif verb == "shell":
                 if IPYTHON_INSTALLED:
                     wprint("Welcome to the subshell, you can use the resultdb object to interact with the dataset.")
@@ -202,7 +254,8 @@ def main_loop(resultdb):
                     filtered_attr = select_attribute(resultdb, "Which attribute would you like to filter by? ")
                 elif filtered_attr is None:
                     continue
-                matches = RelevanceFilteredResultList(result for result in resultdb.results if filter_str in result[filtered_attr])
+                matching_ordinals = resultdb.find_matching_ordinals(filtered_attr, lambda value: filter_str in value)
+                matches = RelevanceFilteredResultList(ordinals=matching_ordinals, resultstore=resultdb.resultstore)
                 wprint(matches.show_view()[0])
             elif verb == "invfind":
                 if not len(args):
@@ -214,7 +267,8 @@ def main_loop(resultdb):
                     filtered_attr = select_attribute(resultdb, "Which attribute would you like to filter by? ")
                 elif filtered_attr is None:
                     continue
-                matches = RelevanceFilteredResultList(result for result in resultdb.results if filter_str not in result[filtered_attr])
+                matching_ordinals = resultdb.find_matching_ordinals(filtered_attr, lambda value: filter_str not in value)
+                matches = RelevanceFilteredResultList(ordinals=matching_ordinals, resultstore=resultdb.resultstore)
                 wprint(matches.show_view()[0])
             elif verb == "search":
                 if not len(args):
@@ -226,9 +280,9 @@ def main_loop(resultdb):
                     filtered_attr = select_attribute(resultdb, "Which attribute would you like to filter by? ")
                 elif filtered_attr is None:
                     continue
-                matches = [result for result in resultdb.results if filter_str in result[filtered_attr]]
-                resultdb.register_grouped_results(filtered_attr,filter_str,matches)
-                wprint(f"Found {len(matches)} results, and saved them as a new result group.")
+                matching_ordinals = resultdb.find_matching_ordinals(filtered_attr, lambda value: filter_str in value)
+                resultdb.register_grouped_results(filtered_attr,filter_str,matching_ordinals)
+                wprint(f"Found {len(matching_ordinals)} results, and saved them as a new result group.")
             elif verb == "invsearch":
                 if not len(args):
                     wprint("Need to provide a string to search by.")
@@ -239,9 +293,9 @@ def main_loop(resultdb):
                     filtered_attr = select_attribute(resultdb, "Which attribute would you like to filter by? ")
                 elif filtered_attr is None:
                     continue
-                matches = [result for result in resultdb.results if filter_str not in result[filtered_attr]]
-                resultdb.register_grouped_results(filtered_attr,filter_str,matches)
-                wprint(f"Found {len(matches)} results, and saved them as a new result group.")
+                matching_ordinals = resultdb.find_matching_ordinals(filtered_attr, lambda value: filter_str not in value)
+                resultdb.register_grouped_results(filtered_attr,filter_str,matching_ordinals)
+                wprint(f"Found {len(matching_ordinals)} results, and saved them as a new result group.")
             elif verb == "game":
                 ptr = get_ptr_from_id_arg(resultdb, args)
                 if ptr is False:
@@ -261,11 +315,9 @@ def main_loop(resultdb):
                     filtered_attr = select_attribute(resultdb, "Which attribute would you like to filter by? ")
                 elif filtered_attr is None:
                     continue
-                ct = 0
-                for result in resultdb.results:
-                    if filter_str.lower() in result[filtered_attr].lower():
-                        result.mark_irrelevant()
-                        ct += 1
+                matching_ordinals = resultdb.find_matching_ordinals(filtered_attr,
+                                                                    lambda value: filter_str.lower() in value.lower())
+                ct = len(resultdb.resultstore.set_relevance(matching_ordinals, False))
                 wprint(f"Marked {ct} results as irrelevant using the filter.")
             elif verb == "invfilter":
                 if not len(args):
@@ -277,11 +329,9 @@ def main_loop(resultdb):
                     filtered_attr = select_attribute(resultdb, "Which attribute would you like to filter by? ")
                 elif filtered_attr is None:
                     continue
-                ct = 0
-                for result in resultdb.results:
-                    if filter_str.lower() not in result[filtered_attr].lower():
-                        result.mark_irrelevant()
-                        ct += 1
+                matching_ordinals = resultdb.find_matching_ordinals(filtered_attr,
+                                                                    lambda value: filter_str.lower() not in value.lower())
+                ct = len(resultdb.resultstore.set_relevance(matching_ordinals, False))
                 wprint(f"Marked {ct} results as irrelevant using the filter.")
 
             
@@ -376,11 +426,11 @@ def main_loop(resultdb):
                                 wprint("Aborting export, no files written.")
                                 continue
                             wprint("Overwriting file...")
-                        with gzip.GzipFile(fname,"wb") as f:
-                            json_encoder = json.JSONEncoder()
-                            for result_json in all_results_json_gen:
-                                for chunk in json_encoder.iterencode(result_json):
-                                    f.write(chunk.encode('utf-8'))
+                        # one JSON object per line, after the header, so that they can be loaded one-by-one too.
+                        json_encoder = json.JSONEncoder()
+                        header = give_export_header("json", resultdb.result_class, obj.size())
+                        write_compressed_output(fname, itertools.chain([header], ((json_encoder.encode(result_json)+"\n").encode('utf-8')
+                                                                                  for result_json in all_results_json_gen)))
                         wprint(f"Export success, compressed JSON output written to {fname}.")
                     except PermissionError:
                         wprint("Failed to open the specified file, maybe try an absolute path? (FYI, quotes are supported.)")
@@ -411,11 +461,10 @@ def main_loop(resultdb):
                                 wprint("Aborting export, no files written.")
                                 continue
                             wprint("Overwriting file...")
-                        with gzip.GzipFile(fname,"wb") as f:
-                            # pickle-dump the results one by one, allowing them to be loaded one-by-one when loading back.
-                            # https://stackoverflow.com/questions/20716812/saving-and-loading-multiple-objects-in-pickle-file
-                            for result in resultgen:
-                                pickle.dump(result, f)
+                        # pickle-dump the results one by one, allowing them to be loaded one-by-one when loading back.
+                        # https://stackoverflow.com/questions/20716812/saving-and-loading-multiple-objects-in-pickle-file
+                        header = give_export_header("pickle", resultdb.result_class, obj.size())
+                        write_compressed_output(fname, itertools.chain([header], (pickle.dumps(result) for result in resultgen)))
                         wprint(f"Export success, compressed serialized output written to {fname}.")
                     except PermissionError:
                         wprint("Failed to open the specified file, maybe try an absolute path? (FYI, quotes are supported.)")
@@ -423,6 +472,27 @@ def main_loop(resultdb):
                 except Exception as e:
                     wprint(f"Exception encountered while exporting: {e}")
                     continue
+            elif verb == "snapshot":
+                if not len(args):
+                    wprint("Need a filename to write the snapshot to.")
+                    continue
+                try:
+                    fname = args[0]
+                    try:
+                        if os.path.isfile(fname):
+                            answer = winput("WARNING: file already exists. Override? (N/y) ").strip().lower()
+                            if not (answer == "y" or answer == "yes"):
+                                wprint("Aborting snapshot, no files written.")
+                                continue
+                            wprint("Overwriting file...")
+                        resultdb.write_snapshot(fname)
+                        wprint(f"Snapshot success, all results written to {fname}.")
+                    except PermissionError:
+                        wprint("Failed to open the specified file, maybe try an absolute path? (FYI, quotes are supported.)")
+                    continue
+                except Exception as e:
+                    wprint(f"Exception encountered while writing the snapshot: {e}")
+                    continue
             else:
                 wprint("Unrecognized command.\n")
                 continue
@@ -515,15 +585,36 @@ def main():
                         help='the directory containing tool output files to be parsed',
                         type=str, nargs='+', default='')
     diargs.add_argument('--import_whittler_output',
-                        help='consume and continue working with one or more files that were outputted by Whittler\'s "export" command',
+                        help='consume and continue working with one or more files that were outputted by Whittler\'s "export", '+\
+                             '"exportjson" or "snapshot" commands',
                         type=str, nargs='+', default=None, metavar="FILE_OR_DIR")
     diargs.add_argument('--memory_compression',
                         help='enable in-memory compression for working with very large datasets',
                         action='store_true')
+    diargs.add_argument('--columnar_storage',
+                        help='store results column by column, with each distinct attribute value stored only once, to greatly '+\
+                             'reduce memory usage for very large datasets',
+                        action='store_true')
+    diargs.add_argument('--memory_map_plaintext',
+                        help='with the plaintext module, read lines from memory-mapped files whenever they\'re needed '+\
+                             'instead of keeping them in memory, to load files much bigger than the available memory',
+                        action='store_true')
+    diargs.add_argument('--source_context',
+                        help='add the N lines on either side of the line each result points at in its source file to the '+\
+                             'result, as its "source_context" (bandit, devskim, gosec and semgrep)',
+                        type=int, default=None, metavar="N")
+    diargs.add_argument('--cache_parsed_files',
+                        help='keep the results parsed from each file in a cache in the .whittler folder in your home '+\
+                             'directory, and load files that haven\'t changed since they were last parsed from it',
+                        action='store_true')
     diargs.add_argument('--multiprocessing',
                         help='enable multiprocessing for working with very large datasets (in development, currently only '+\
-                             'accelerates imports from directories with many files)',
+                             'accelerates imports from directories with many files and from very large plaintext and '+\
+                             'trufflehog files, exports, and grouping by similarity)',
                         action='store_true')
+    diargs.add_argument('--workers',
+                        help='the number of worker processes to use with --multiprocessing (default: one per CPU)',
+                        type=int, default=None, metavar="N")
 
     # Output control args
     ocargs = parser.add_argument_group("output control arguments")
@@ -554,11 +645,33 @@ def main():
     if args.memory_compression:
         Config.MEMORY_COMPRESSION = True
         Config.MemoryCompressor.COMPRESSION_ENABLED = True
+        Config.MemoryCompressor.MODE = Config.MEMORY_COMPRESSION_MODE
+        Config.MemoryCompressor.PER_ATTRIBUTE_DICTIONARIES = Config.MEMORY_COMPRESSION_PER_ATTRIBUTE
+        Config.DecompressionCache.configure(max_bytes=Config.DECOMPRESSION_CACHE_BYTES)
     
+    if args.columnar_storage:
+        Config.COLUMNAR_STORAGE = True
+
+    Config.InternTable.configure(weak=Config.INTERN_WEAK_REFERENCES, max_size=Config.INTERN_TABLE_MAX_SIZE)
+
+    if args.memory_map_plaintext:
+        Config.MEMORY_MAP_PLAINTEXT = True
+
+    if not args.source_context is None:
+        Config.SOURCE_CONTEXT_LINES = args.source_context
+    Config.SourceContext.configure(Config.SOURCE_CONTEXT_CACHE_BYTES)
+
+    if args.cache_parsed_files:
+        Config.PARSED_FILE_CACHE = True
+
     if args.multiprocessing:
         Config.MULTIPROCESSING = True
         Config.MemoryCompressor.MULTIPROCESSING = True
 
+    if not args.workers is None:
+        Config.WORKER_PROCESSES = args.workers
+    Config.WorkerPool.configure(processes=Config.WORKER_PROCESSES, bundle_seconds=Config.WORKER_BUNDLE_SECONDS)
+
     if not args.log_output is None:
         logdir = args.log_output[0] if isinstance(args.log_output,list) else args.log_output
         try:
@@ -583,6 +696,8 @@ def main():
             resultdb = ResultDatabase(result_classes[config])
         else:
             resultdb = ResultDatabase(load_module(config, False))
+        if Config.PARSED_FILE_CACHE:
+            resultdb.parsed_file_cache = ParsedFileCache(WHITTLER_DIRECTORY+"/cache")
         if not args.dir and not args.file and not args.import_whittler_output:
             parser.print_help()
             sys.exit(1)
@@ -599,7 +714,7 @@ def main():
                 wprint(f"Importing script from file {args.scriptfile[0]} .")
                 with open(args.scriptfile[0],"r") as f:
                     cached_commands = parse_user_input(" ; ".join(f.readlines()))
-        hash_cache = set()
+        hash_cache = {}
         if args.dir:
             wprint("Parsing files from provided directories...")
             wprint()
@@ -609,7 +724,7 @@ def main():
             wprint("Parsing provided files...")
             wprint()
             for fname in args.file:
-                resultdb.parse_from_file(fname, hash_cache=hash_cache)
+                resultdb.parse_from_file(fname, hash_cache=hash_cache, multiprocessing_import=args.multiprocessing)
         if args.import_whittler_output:
             wprint("Importing provided files...")
             wprint()
@@ -629,6 +744,8 @@ def main():
     except:
         raise
     finally:
+        # Also reached on Ctrl-C and exit, so that no worker processes are left behind.
+        Config.WorkerPool.shutdown()
         print()
         if not command_redirect_file is None:
             fname = command_redirect_file.name.replace('\\','/')
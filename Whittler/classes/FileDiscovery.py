@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import fnmatch
+import os
+
+
+# Finds the files to parse under a directory, recursively. Directories are scanned by a pool of threads (os.scandir
+# spends most of its time in system calls, which don't hold the GIL), and files are yielded while the scan is still
+# going, so that parsing can start on the first files right away.
+#
+# Files are filtered by glob patterns: a pattern with a "/" in it is matched against the file's path relative to the
+# directory, and any other pattern is matched against the file's name. Excluded directories aren't scanned at all.
+#
+# The files found are yielded in windows of up to window_size files, each sorted by size, largest first, so that the
+# biggest files are started on first and the parallel parsing of the rest evens out at the end.
+class FileDiscovery:
+    def __init__(self, include_globs=("*",), exclude_globs=(), threads=8, window_size=1000):
+        self.include_globs = include_globs
+        self.exclude_globs = exclude_globs
+        self.threads = threads
+        self.window_size = window_size
+
+    @staticmethod
+    def _matches(globs, relpath, name):
+        return any(fnmatch.fnmatch(relpath if "/" in glob else name, glob) for glob in globs)
+
+    # Gives the (size, path) of each matching file directly in dirpath, and the subdirectories to scan next.
+    def _scan(self, root, dirpath):
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(dirpath) as entries:
+                for entry in entries:
+                    relpath = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                    if self._matches(self.exclude_globs, relpath, entry.name):
+                        continue
+                    try:
+                        # Symlinked directories aren't followed, since they could lead in circles.
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.is_file() and self._matches(self.include_globs, relpath, entry.name):
+                            files.append((entry.stat().st_size, entry.path))
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"Warning: could not scan {dirpath}: {e}")
+        return files, subdirs
+
+    # Yields the path of each file found, or (path, size) tuples if with_sizes is set.
+    def iter_files(self, root, with_sizes=False):
+        window = []
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            scans = {executor.submit(self._scan, root, root)}
+            while scans:
+                done, scans = wait(scans, return_when=FIRST_COMPLETED)
+                for scan in done:
+                    files, subdirs = scan.result()
+                    window.extend(files)
+                    for subdir in subdirs:
+                        scans.add(executor.submit(self._scan, root, subdir))
+                if len(window) >= self.window_size or not scans:
+                    window.sort(key=lambda file: (-file[0], file[1]))
+                    for size, path in window:
+                        yield (path, size) if with_sizes else path
+                    window = []
@@ -0,0 +1,73 @@
+import numpy as np
+
+
+# A numpy array that can be appended to in amortized constant time. The underlying buffer is over-allocated
+# and doubled whenever it fills up, and view() gives a numpy view of just the populated part of it.
+class GrowableArray:
+    def __init__(self, dtype, initial_capacity=16, fill_value=0):
+        self.fill_value = fill_value
+        self._data = np.empty(initial_capacity, dtype=dtype)
+        self._len = 0
+
+    # Wraps an existing array without copying it, e.g. one that's memory-mapped from a file, and so may be read-only.
+    # It's only copied into a buffer of its own once it has to grow.
+    @classmethod
+    def wrap(cls, array, fill_value=0):
+        ret = cls.__new__(cls)
+        ret.fill_value = fill_value
+        ret._data = array
+        ret._len = len(array)
+        return ret
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    def __len__(self):
+        return self._len
+
+    def reserve(self, capacity):
+        if capacity <= len(self._data):
+            return
+        new_data = np.empty(max(capacity, 2*len(self._data)), dtype=self._data.dtype)
+        new_data[:self._len] = self._data[:self._len]
+        self._data = new_data
+
+    def append(self, value):
+        if self._len == len(self._data):
+            self.reserve(self._len+1)
+        self._data[self._len] = value
+        self._len += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        if not len(values):
+            # Wrapped arrays may be read-only, even if there's nothing to write to them.
+            return
+        self.reserve(self._len+len(values))
+        self._data[self._len:self._len+len(values)] = values
+        self._len += len(values)
+
+    # Grows the array to the given length, padding it with the fill value.
+    def pad_to(self, length):
+        if length > self._len:
+            self.extend(np.full(length-self._len, self.fill_value, dtype=self._data.dtype))
+
+    # Views stay valid after later appends, but they won't see the appended values.
+    def view(self):
+        return self._data[:self._len]
+
+    def __getitem__(self, index):
+        # Fast path for single elements, which are looked up a lot.
+        if type(index) is int and 0 <= index < self._len:
+            return self._data[index]
+        return self.view()[index]
+
+    def __setitem__(self, index, value):
+        self.view()[index] = value
+
+    def __iter__(self):
+        return iter(self.view())
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.view()!r})"
@@ -0,0 +1,240 @@
+from json.decoder import JSONDecoder, JSONDecodeError, scanstring
+import re
+
+
+# Reads the elements of an array nested somewhere inside a JSON document one at a time, from a text file that is read
+# in chunks, so that only one element (and not the whole document) is ever decoded and held in memory at once.
+#
+# The array is given as a path like "Results[].Vulnerabilities[]", which yields every element of the "Vulnerabilities"
+# array of every element of the top-level "Results" array. "[]" on its own is the top-level array itself. Missing keys,
+# and values of the wrong type along the path, just yield nothing.
+#
+# Everything that isn't on the path is skipped over without being decoded, except for the scalar values (strings,
+# numbers, booleans and nulls) of the objects along the path, which are kept so that elements can be yielded along
+# with the values of their enclosing objects (e.g. the "Target" of each trivy Result). The keys of an object can come
+# in any order, so if some of the values that are needed of an object haven't been seen yet by the time its elements
+# are reached, the text of the elements is held back (undecoded) until the object ends, and they're decoded and
+# yielded then. Otherwise (e.g. for trivy, which writes the Target before the Vulnerabilities), they're yielded as
+# they're read.
+class IncrementalJSONReader:
+
+    CHUNK_SIZE = 2**16
+
+    _decoder = JSONDecoder()
+    _next_token = re.compile(r'["\[\]{}]').search
+    # The rest of a string, after its opening quote.
+    _string_rest = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.S).match
+    _whitespace = re.compile(r'[ \t\n\r]*').match
+
+    def __init__(self, f, chunk_size=None):
+        self.f = f
+        self.chunk_size = self.CHUNK_SIZE if chunk_size is None else chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        # While reading a value's text (see _raw_value), the pieces of it that have been read so far, and where the
+        # rest of it starts in the buffer.
+        self._kept = None
+        self._keep_from = 0
+
+    # Reads at least min_chars more characters into the buffer if there are any left, dropping the part of the buffer
+    # that has already been consumed. Returns False at the end of the file.
+    def _fill(self, min_chars=0):
+        if self.eof:
+            return False
+        chunk = self.f.read(max(self.chunk_size, min_chars))
+        if not chunk:
+            self.eof = True
+            return False
+        if not self._kept is None:
+            self._kept.append(self.buf[self._keep_from:self.pos])
+            self._keep_from = 0
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    # Skips whitespace, and gives the next character without consuming it ("" at the end of the file).
+    def _peek(self):
+        while True:
+            self.pos = self._whitespace(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, chars):
+        c = self._peek()
+        if c == "" or not c in chars:
+            raise JSONDecodeError(f"Expecting one of {chars!r}", self.buf, self.pos)
+        self.pos += 1
+        return c
+
+    # Decodes whatever is at the current position with decode(buf, pos), which gives (value, end), reading more of the
+    # file for as long as the value runs past the end of the buffer. The amount read is doubled each time, so values
+    # of any size are decoded in linear time.
+    def _decode_with(self, decode):
+        while True:
+            try:
+                value, end = decode(self.buf, self.pos)
+                # A number that runs up to the end of the buffer might continue in the next chunk, even if it looks
+                # complete (e.g. "-2." ends up decoded as -2).
+                if self.eof or (end < len(self.buf) and not self.buf[end] in "0123456789.eE+-"):
+                    self.pos = end
+                    return value
+            except JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill(len(self.buf)-self.pos)
+
+    def _decode_value(self):
+        self._peek()
+        return self._decode_with(self._decoder.raw_decode)
+
+    def _decode_key(self):
+        self._expect('"')
+        return self._decode_with(scanstring)
+
+    # Skips over the value at the current position, without decoding it.
+    def _skip_value(self):
+        if not self._peek() in "[{":
+            self._decode_value()
+            return
+        depth = 0
+        while True:
+            match = self._next_token(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                if not self._fill():
+                    raise JSONDecodeError("Unterminated value", self.buf, self.pos)
+                continue
+            self.pos = match.end()
+            c = match.group()
+            if c == '"':
+                while True:
+                    string_match = self._string_rest(self.buf, self.pos)
+                    if not string_match is None:
+                        self.pos = string_match.end()
+                        break
+                    if not self._fill(len(self.buf)-self.pos):
+                        raise JSONDecodeError("Unterminated string", self.buf, self.pos)
+            elif c in "[{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    # Gives the text of the value at the current position, as a list of pieces about a chunk long each, and skips over
+    # it without decoding it.
+    def _raw_value(self):
+        self._peek()
+        self._kept = []
+        self._keep_from = self.pos
+        try:
+            self._skip_value()
+            self._kept.append(self.buf[self._keep_from:self.pos])
+            return self._kept
+        finally:
+            self._kept = None
+
+    # Yields every element found at the path (see above), or (element, parents) tuples if with_parents is set, where
+    # parents is a list of dicts of the scalar values of each object along the path, outermost first. parent_keys can
+    # give the keys that are needed of each of those objects, innermost first (e.g. [{"Target", "Class"}]), in which
+    # case only their values are sure to be known when each element is yielded. Otherwise, all of their values are,
+    # which means holding back the elements of every object along the path until it ends.
+    def iter_path(self, path, with_parents=False, parent_keys=None):
+        steps = []
+        for key in path.split("."):
+            if key.endswith("[]"):
+                key = key[:-2]
+                if key:
+                    steps.append(key)
+                steps.append(None)
+            elif key:
+                steps.append(key)
+        if not with_parents:
+            parent_keys = []
+        for value, parents in self._walk(steps, [], parent_keys):
+            yield (value, parents) if with_parents else value
+
+    # Yields each of a sequence of JSON values that are just tacked together, optionally separated by whitespace (e.g.
+    # "{...} {...}\n{...}"), as output by tools that write one JSON object after another instead of an array.
+    def iter_values(self):
+        while self._peek() != "":
+            yield self._decode_value()
+
+    # Each step is either a key to look up in an object, or None to go through the elements of an array. parent_keys
+    # is as given to iter_path, or None if every value of every object along the path is needed.
+    def _walk(self, steps, parents, parent_keys):
+        if not steps:
+            yield self._decode_value(), parents
+            return
+        step, rest = steps[0], steps[1:]
+        c = self._peek()
+        if step is None:
+            if c != "[":
+                self._skip_value()
+                return
+            self.pos += 1
+            if self._peek() == "]":
+                self.pos += 1
+                return
+            if not rest:
+                # The elements themselves are what's being read, so they're decoded right here, rather than one more
+                # generator down for each of them.
+                while True:
+                    yield self._decode_value(), parents
+                    if self._expect(",]") == "]":
+                        return
+            while True:
+                yield from self._walk(rest, parents, parent_keys)
+                if self._expect(",]") == "]":
+                    return
+        else:
+            if c != "{":
+                self._skip_value()
+                return
+            self.pos += 1
+            if self._peek() == "}":
+                self.pos += 1
+                return
+            scalars = {}
+            if parent_keys is None:
+                needed_keys = None
+            else:
+                # This object's place among the objects left along the path, counting from the innermost one.
+                level = sum(1 for key in steps if not key is None)
+                needed_keys = parent_keys[level-1] if level <= len(parent_keys) else ()
+            held = []
+            while True:
+                key = self._decode_key()
+                self._expect(":")
+                if key == step:
+                    if needed_keys is None or any(not needed_key in scalars for needed_key in needed_keys):
+                        held.append(self._raw_value())
+                    else:
+                        yield from self._walk(rest, parents+[scalars], parent_keys)
+                elif self._peek() in "[{":
+                    self._skip_value()
+                else:
+                    scalars[key] = self._decode_value()
+                if self._expect(",}") == "}":
+                    while held:
+                        reader = IncrementalJSONReader(_TextPieces(held.pop(0)), self.chunk_size)
+                        yield from reader._walk(rest, parents+[scalars], parent_keys)
+                    return
+
+
+# A file to read text back from that's held as a list of pieces, each of which is let go of once it's been read.
+class _TextPieces:
+    def __init__(self, pieces):
+        pieces.reverse()
+        self.pieces = pieces
+
+    def read(self, size):
+        read_pieces = []
+        read_chars = 0
+        while self.pieces and read_chars < size:
+            read_pieces.append(self.pieces.pop())
+            read_chars += len(read_pieces[-1])
+        return "".join(read_pieces)
@@ -0,0 +1,67 @@
+from collections import namedtuple
+import weakref
+
+
+InternStats = namedtuple("InternStats", ["size", "hits", "misses", "collisions", "evictions"])
+
+# Maps content keys (e.g. hashes) to a single shared instance of each distinct value. Since keys can collide, a
+# lookup only counts as a hit if the caller confirms that the interned value really is equal to the one it has.
+#
+# With weak references enabled, an interned value is dropped from the table as soon as nothing else uses it, so
+# values die with the results that hold them. Otherwise the table holds on to its values itself, and if max_size
+# is set, the oldest entries are evicted once the table grows past it. An evicted value stays valid wherever it is
+# used, it just won't be shared with values interned after it.
+class InternTable:
+    def __init__(self, weak=False, max_size=None):
+        self.weak = weak
+        self.max_size = max_size
+        self._table = weakref.WeakValueDictionary() if weak else {}
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.evictions = 0
+
+    # Gives the interned value for key if is_equal(interned_value) holds, and None otherwise.
+    def lookup(self, key, is_equal):
+        value = self._table.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        if not is_equal(value):
+            # A different value with the same key. It stays interned, and the new value just goes unshared.
+            self.collisions += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def add(self, key, value):
+        if key in self._table:
+            return
+        self._table[key] = value
+        self._evict()
+
+    def _evict(self):
+        if not self.weak and not self.max_size is None:
+            while len(self._table) > self.max_size:
+                del self._table[next(iter(self._table))]
+                self.evictions += 1
+
+    # Switches between weak and strong references (see above), keeping every value interned so far.
+    def configure(self, weak=None, max_size=None):
+        if not weak is None and weak != self.weak:
+            table = weakref.WeakValueDictionary() if weak else {}
+            table.update(self._table.items())
+            self._table = table
+            self.weak = weak
+        self.max_size = max_size
+        self._evict()
+
+    def clear(self):
+        self._table.clear()
+
+    def stats(self):
+        return InternStats(len(self._table), self.hits, self.misses, self.collisions, self.evictions)
+
+    def __len__(self):
+        return len(self._table)
@@ -0,0 +1,55 @@
+from collections import OrderedDict, namedtuple
+
+
+LRUCacheStats = namedtuple("LRUCacheStats", ["size", "bytes", "max_bytes", "hits", "misses", "evictions"])
+
+# A cache bounded by the total size (in bytes, as given by the caller) of the values in it. Once it grows past
+# max_bytes, the least recently used values are evicted first.
+class LRUCache:
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Gives the cached value for key, or None if it isn't cached.
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value, size):
+        # Values that would take up the whole cache by themselves aren't worth evicting everything else for.
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def configure(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self):
+        return LRUCacheStats(len(self._entries), self._bytes, self.max_bytes, self.hits, self.misses, self.evictions)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,84 @@
+from Whittler.classes.MemoryCompressor import MaybeCompressedString, MCSInternTable
+import mmap
+import os
+
+
+# A read-only memory map of a file that MappedStrings point into. Each file is only mapped once per process (see
+# give_mapped_file), and pickles as its path, so that a MappedString sent to another process (or stored in a
+# ParsedFileCache) maps the same file again on the other end, rather than carrying its text along.
+class MappedFile:
+    def __init__(self, path, encoding="utf-8"):
+        self.path = path
+        self.encoding = encoding
+        with open(path, "rb") as f:
+            # Empty files can't be mapped, but then there's nothing to point into anyway.
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+    # Lines are read from the file as bytes, so line endings are normalized the way text mode would have.
+    def decode(self, data_bytes):
+        data_string = data_bytes.decode(self.encoding)
+        if data_string.endswith("\r\n"):
+            data_string = data_string[:-2]+"\n"
+        return data_string
+
+    def __reduce__(self):
+        return (give_mapped_file, (self.path, self.encoding))
+
+_mapped_files = {}
+
+def give_mapped_file(path, encoding="utf-8"):
+    key = (os.path.abspath(path), encoding)
+    mapped_file = _mapped_files.get(key)
+    if mapped_file is None:
+        mapped_file = MappedFile(key[0], encoding)
+        _mapped_files[key] = mapped_file
+    return mapped_file
+
+
+# A value that stays in the file it was parsed from. Only its offset and length in the file are kept in memory,
+# along with its hash and digest, and it's decoded from the file's memory map whenever it's read. The OS keeps the
+# parts of the file that are read often in its page cache, and can drop the rest, so that a file much bigger than
+# the available memory can still be loaded.
+#
+# Mapped values are interned, grouped and compared just like any other MaybeCompressedString (their hash is that of
+# their decoded value), so an equal value is only kept once whichever way it was stored first. The file has to stay
+# unchanged for as long as its values are in use.
+class MappedString(MaybeCompressedString):
+
+    # There can be one of these per line of a huge file, so they're kept as small as possible (the hash and digest are
+    # in MaybeCompressedString's slots).
+    __slots__ = ("mapped_file", "offset", "length")
+
+    compressed = False
+
+    # The decoded value can be passed in if it's already known, which saves decoding it again.
+    def __new__(cls, mapped_file, offset, length, data_string=None, digest=None):
+        if data_string is None:
+            data_string = mapped_file.decode(mapped_file.map[offset:offset+length])
+        data_string_hash = hash(data_string)
+        interned = MCSInternTable.lookup(data_string_hash,
+                                         lambda mcs: mcs._equals(data_string, data_string.encode('utf-8')))
+        if not interned is None:
+            return interned
+        ret = bytearray.__new__(cls)
+        ret._cached_hash = data_string_hash
+        ret.digest = MaybeCompressedString.digest_of(data_string.encode('utf-8')) if digest is None else digest
+        ret.mapped_file = mapped_file
+        ret.offset = offset
+        ret.length = length
+        MCSInternTable.add(data_string_hash, ret)
+        return ret
+
+    # Also called when a MappedString is passed through MaybeCompressedString(), which gives it back as it is.
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def _equals(self, data_string, data_bytes):
+        return self.value == data_string
+
+    def __reduce__(self):
+        return (MappedString, (self.mapped_file, self.offset, self.length, None, self.digest))
+
+    @property
+    def value(self):
+        return self.mapped_file.decode(self.mapped_file.map[self.offset:self.offset+self.length])
@@ -1,5 +1,10 @@
 # from Whittler.config import ConfigurableInterface
 from Whittler.classes.Singleton import Singleton
+from Whittler.classes.InternTable import InternTable
+from Whittler.classes.LRUCache import LRUCache
+from collections import defaultdict
+import hashlib
+import sys
 import zlib
 
 # TODO: this can all be coded in cpython! That would be a kickass library to have exist!
@@ -7,6 +12,12 @@ import zlib
 
 # based on https://stackoverflow.com/questions/479218/how-to-compress-small-strings
 class MemoryCompressor(Singleton):#, ConfigurableInterface):
+
+    # The largest preset dictionary zlib can make use of, i.e. the size of its window.
+    ZDICT_SIZE = 2**15
+    # In zdict mode, training stops early once this many bytes of sample values have been collected.
+    ZDICT_TRAINING_BYTES = 2**20
+
     def __init__(self):
         # wbits=-15 gives a raw output stream with no header or checksum, with a 2**15 byte window.
         self.compressor = zlib.compressobj(wbits=-15)
@@ -19,9 +30,47 @@ class MemoryCompressor(Singleton):#, ConfigurableInterface):
 
         self.COMPRESSION_ENABLED = False
 
-    def train(self, training_str):
+        # In "zdict" mode, a preset dictionary is built from a sample of the values seen during training, and every
+        # value is compressed on its own against it, so decompressing a value costs no more than inflating it. In
+        # "stream" mode, the values seen during training are pushed through a shared compression stream instead, and
+        # every value is compressed and decompressed by a copy of it.
+        self.MODE = "zdict"
+        # In zdict mode, build a separate preset dictionary for the values of each attribute.
+        self.PER_ATTRIBUTE_DICTIONARIES = False
+
+        self.zdicts = []
+        self._zdict_ids = {}
+        # A compressor and a decompressor already primed with each preset dictionary. Copying these is a good deal
+        # cheaper than setting up a new one with the dictionary every time.
+        self._zdict_compressors = []
+        self._zdict_decompressors = []
+        # Sample values for the preset dictionaries, by attribute name (or None, for values with no attribute).
+        self._zdict_samples = defaultdict(list)
+        self._zdict_sample_bytes = 0
+
+    # Compresses the value in place, or trains on it if still in training mode. Values that wouldn't get any smaller
+    # are left uncompressed.
+    def store(self, mcs, attrname=None):
+        if not self.training_mode:
+            self._compress_in_place(mcs, attrname)
+            return
+        self.train(bytes(mcs), attrname)
+        self.add_compression_callback(mcs, attrname)
+        # The number of trained values is counted per value rather than per result object, since values are stored
+        # one attribute at a time.
+        if len(self.trainee_compression_callbacks) >= self.total_train_count or \
+                (self.MODE == "zdict" and self._zdict_sample_bytes >= self.ZDICT_TRAINING_BYTES):
+            print("\nMEMORY COMPRESSION TRAINING DONE.")
+            self.disable_training_mode()
+
+    def train(self, training_bytes, attrname=None):
         assert self.training_mode
-        training_bytes = training_str.encode('utf-8')
+        if self.MODE == "zdict":
+            sample = training_bytes[:self.ZDICT_SIZE]
+            self._zdict_samples[attrname].append(sample)
+            self._zdict_sample_bytes += len(sample)
+            return
+
         self.junk_offset += len(training_bytes)
 
         # run the training line through the compressor and decompressor
@@ -30,91 +79,143 @@ class MemoryCompressor(Singleton):#, ConfigurableInterface):
         # use Z_SYNC_FLUSH. A full flush seems to detrain the compressor, and 
         # not flushing wastes space.
         self.junk_offset -= len(self.decompressor.decompress(self.compressor.flush(zlib.Z_SYNC_FLUSH)))
-
-        # If we have trained on at least self.total_train_count result objects, then disable training_mode.
-        # The second half of the if statement is necessary because we call train() on each call to Result.__setitem__,
-        # not on each creation of a Result object.
-        if len(self.trainee_compression_callbacks) >= self.total_train_count:
-            print("\nMEMORY COMPRESSION TRAINING DONE.")
-            self.disable_training_mode()
-            return self.compress(training_str.encode('utf-8'))
-        
-        return training_str
     
-    def add_compression_callback(self, mcd):
-        self.trainee_compression_callbacks.append(mcd)
+    def add_compression_callback(self, mcd, attrname=None):
+        self.trainee_compression_callbacks.append((mcd, attrname))
     
     def disable_training_mode(self):
         self.training_mode = False
-        for mcd in self.trainee_compression_callbacks:
+        if self.MODE == "zdict":
+            self._build_zdicts()
+        for mcd, attrname in self.trainee_compression_callbacks:
             assert not mcd.compressed
-            compressed = self.compress(mcd)
-            del mcd[:]
-            mcd.extend(compressed)
-            mcd.compressed = True
+            self._compress_in_place(mcd, attrname)
+        self.trainee_compression_callbacks = []
+
+    def _build_zdicts(self):
+        all_samples = [sample for samples in self._zdict_samples.values() for sample in samples]
+        self._zdict_ids[None] = self._add_zdict(all_samples)
+        if self.PER_ATTRIBUTE_DICTIONARIES:
+            for attrname, samples in self._zdict_samples.items():
+                if not attrname is None:
+                    self._zdict_ids[attrname] = self._add_zdict(samples)
+        self._zdict_samples.clear()
+
+    # Builds a preset dictionary out of samples spread evenly over the given ones, and returns its id.
+    def _add_zdict(self, samples):
+        total_bytes = sum(len(sample) for sample in samples)
+        if total_bytes > self.ZDICT_SIZE:
+            keep_every = total_bytes/self.ZDICT_SIZE
+            samples = [samples[int(i*keep_every)] for i in range(int(len(samples)/keep_every))]
+        zdict = b"".join(samples)[-self.ZDICT_SIZE:]
+        # zlib refuses empty preset dictionaries, which is what we have if there was nothing to train on.
+        zdict_kwargs = {"zdict":zdict} if zdict else {}
+        self.zdicts.append(zdict)
+        self._zdict_compressors.append(zlib.compressobj(9, zlib.DEFLATED, -15, **zdict_kwargs))
+        self._zdict_decompressors.append(zlib.decompressobj(wbits=-15, **zdict_kwargs))
+        return len(self.zdicts)-1
+
+    def _compress_in_place(self, mcs, attrname):
+        zdict_id = None
+        if self.MODE == "zdict":
+            zdict_id = self._zdict_ids.get(attrname, self._zdict_ids[None])
+        compressed = self.compress(mcs, zdict_id)
+        if len(compressed) < bytearray.__len__(mcs):
+            del mcs[:]
+            mcs.extend(compressed)
+            mcs.compressed = True
+            mcs.zdict_id = zdict_id
 
     # Takes bytearray or bytes, returns bytes
-    def compress(self,b):
-        compressor = self.compressor.copy()
+    def compress(self,b,zdict_id=None):
+        if zdict_id is None:
+            compressor = self.compressor.copy()
+        else:
+            compressor = self._zdict_compressors[zdict_id].copy()
         ret = compressor.compress(b)+compressor.flush()
         return ret
 
     # Takes bytearray or bytes, returns bytes
-    def decompress(self,b):
-        decompressor = self.decompressor.copy()
-        return (decompressor.decompress(b)+decompressor.flush())[self.junk_offset:]
+    def decompress(self,b,zdict_id=None):
+        if zdict_id is None:
+            decompressor = self.decompressor.copy()
+            return (decompressor.decompress(b)+decompressor.flush())[self.junk_offset:]
+        decompressor = self._zdict_decompressors[zdict_id].copy()
+        return decompressor.decompress(b)+decompressor.flush()
 
 MemoryCompressorOnlyInstance = MemoryCompressor()
 
-_MCS_cache = {}
+# Every distinct value is stored once, and shared by all of the results that have it. Values are interned by their
+# hash, and checked for exact equality on a hash match.
+MCSInternTable = InternTable()
+
+# Compressed values that are read often (severities, rule IDs, filenames, ...) are kept decompressed in here, keyed by
+# the id of their MaybeCompressedString. Each entry holds on to its MaybeCompressedString, so that its id can't be
+# reused by another object while it's cached. The size bound is reconfigured from Config.DECOMPRESSION_CACHE_BYTES.
+MCSDecompressionCache = LRUCache(max_bytes=32*2**20)
 
 class MaybeCompressedString(bytearray):
+
+    # There's one of these per distinct value, so they're kept without a __dict__. zdict_id is the id of the preset
+    # dictionary the value was compressed against, if any. The weak reference slot lets MCSInternTable hold values
+    # weakly.
+    __slots__ = ("_cached_hash", "digest", "compressed", "zdict_id", "__weakref__")
     
-    def __new__(cls, data_string):
-        if type(data_string) == MaybeCompressedString:
+    # The attribute name is only used to pick a compression dictionary (see MemoryCompressor.PER_ATTRIBUTE_DICTIONARIES).
+    # The digest can be passed in if it's already known (see ResultBatch).
+    def __new__(cls, data_string, attrname=None, digest=None):
+        if isinstance(data_string, MaybeCompressedString):
             return data_string
         assert type(data_string) == str
+        # Python's string hash is computed once per string object and cached, which makes it the cheapest key.
         data_string_hash = hash(data_string)
-        if data_string_hash in _MCS_cache:
-            return _MCS_cache[data_string_hash]
         data_bytes = data_string.encode('utf-8')
-        add_callback = False
-        if MemoryCompressorOnlyInstance.COMPRESSION_ENABLED:
-            if MemoryCompressorOnlyInstance.training_mode:
-                add_callback = True
-                data = MemoryCompressorOnlyInstance.train(data_string)
-                if type(data) is bytes:
-                    compressed = True
-                else:
-                    data = data_bytes
-                    compressed = False
-            else:
-                data = MemoryCompressorOnlyInstance.compress(data_bytes)
-                compressed = True
-        else:
-            data = data_bytes
-            compressed = False
+        interned = MCSInternTable.lookup(data_string_hash, lambda mcs: mcs._equals(data_string, data_bytes))
+        if not interned is None:
+            return interned
         ret = bytearray.__new__(cls)
         ret._cached_hash = data_string_hash
-        ret.extend(data)
-        ret.compressed = compressed
-        if add_callback:
-            MemoryCompressorOnlyInstance.add_compression_callback(ret)
-        _MCS_cache[data_string_hash] = ret
+        # A 64-bit digest of the value, used to build Result digests (see Result._compute_digest).
+        ret.digest = MaybeCompressedString.digest_of(data_bytes) if digest is None else digest
+        ret.extend(data_bytes)
+        ret.compressed = False
+        ret.zdict_id = None
+        if MemoryCompressorOnlyInstance.COMPRESSION_ENABLED:
+            MemoryCompressorOnlyInstance.store(ret, attrname)
+        MCSInternTable.add(data_string_hash, ret)
         return ret
     
-    def __init__(self, d):
+    def __init__(self, d, attrname=None, digest=None):
         pass
 
+    @staticmethod
+    def digest_of(data_bytes):
+        return int.from_bytes(hashlib.blake2b(data_bytes, digest_size=8).digest(),'little')
+
+    # Exact comparison against a string (given along with its UTF-8 encoding), used to confirm interning matches.
+    def _equals(self, data_string, data_bytes):
+        if self.compressed:
+            return self.value == data_string
+        return bytearray.__eq__(self, data_bytes)
+
     def __reduce__(self):
         cls = self.__class__
         args = (self.value,)
         return (cls,args)
+
+    # bytearray defines its own __reduce_ex__, which pickle would otherwise use instead of __reduce__.
+    def __reduce_ex__(self, protocol):
+        return self.__reduce__()
     
     @property
     def value(self):
         if self.compressed:
-            return MemoryCompressorOnlyInstance.decompress(self).decode('utf-8')
+            cached = MCSDecompressionCache.get(id(self))
+            if not cached is None:
+                return cached[1]
+            value = MemoryCompressorOnlyInstance.decompress(self, self.zdict_id).decode('utf-8')
+            MCSDecompressionCache.put(id(self), (self, value), sys.getsizeof(value))
+            return value
         return self.decode('utf-8')
     
     def __repr__(self):
@@ -130,9 +231,29 @@ class MaybeCompressedString(bytearray):
             return cached_hash
         return hash(self.value)
     
+    # Values with different hashes can't be equal, so only colliding hashes cost a real comparison. Two values in the
+    # same compressed state (i.e. compressed against the same dictionary, or both uncompressed) are equal exactly when
+    # their bytes are, since compression is deterministic. Otherwise (and for MappedStrings, whose bytes live in their
+    # file), the decoded values are compared.
     def __eq__(self, other):
-        return hash(self) == hash(other)
-    
+        if self is other:
+            return True
+        if isinstance(other, str):
+            return hash(self) == hash(other) and self._equals(other, other.encode('utf-8'))
+        if not isinstance(other, MaybeCompressedString):
+            return NotImplemented
+        if hash(self) != hash(other):
+            return False
+        if type(self) is MaybeCompressedString and type(other) is MaybeCompressedString and \
+                self.compressed == other.compressed and self.zdict_id == other.zdict_id:
+            return bytearray.__eq__(self, other)
+        return self.value == other.value
+
+    # bytearray defines its own __ne__, which would compare the raw bytes.
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
     def __len__(self):
         return len(self.value)
     
@@ -0,0 +1,56 @@
+from Whittler.classes.Metadata import WHITTLER_VERSION
+import hashlib
+import pickle
+import os
+
+
+# An on-disk cache of the results parsed from each file, as the ResultBatches they were parsed into (see ResultBatch),
+# so that files that haven't changed since they were last parsed can be loaded without being parsed again.
+#
+# There is one cache entry per file and module, which is only used if the file's size and modification time, the
+# module's parsing settings and the Whittler version all still match. Otherwise the file is parsed again, and its entry
+# overwritten.
+class ParsedFileCache:
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory, mode=0o770, exist_ok=True)
+
+    def _entry_path(self, result_class, fname, deduplicate):
+        name = repr((os.path.abspath(fname), result_class.FRIENDLY_NAME, deduplicate))
+        return os.path.join(self.directory, hashlib.blake2b(name.encode('utf-8'), digest_size=16).hexdigest())
+
+    # The key has to be taken before the file is parsed, so that a file modified while it was being parsed doesn't end
+    # up cached as up to date.
+    @staticmethod
+    def entry_key(result_class, fname):
+        stat = os.stat(fname)
+        return (os.path.abspath(fname), stat.st_size, stat.st_mtime_ns, result_class.FRIENDLY_NAME, WHITTLER_VERSION,
+                result_class.Config.FILE_ENCODING, result_class.Config.REMOVE_ANSI_CONTROL_CHARACTERS,
+                result_class.Config.SOURCE_CONTEXT_LINES if result_class._adds_source_context() else None)
+
+    # Gives the list of batches cached for the file, or None if there's no up-to-date entry for it.
+    def load(self, result_class, fname, deduplicate):
+        try:
+            with open(self._entry_path(result_class, fname, deduplicate), "rb") as f:
+                key, batches = pickle.load(f)
+        except Exception:
+            # Missing, or unreadable for whatever reason (e.g. written by an incompatible version) - either way, the
+            # file just gets parsed again.
+            return None
+        if key != self.entry_key(result_class, fname):
+            return None
+        return batches
+
+    def store(self, result_class, fname, deduplicate, batches, key):
+        path = self._entry_path(result_class, fname, deduplicate)
+        # Written under a temporary name first, so that a concurrent or interrupted run never sees half an entry.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump((key, batches), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Failing to cache a file is no reason to fail parsing it.
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
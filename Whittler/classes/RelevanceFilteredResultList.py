@@ -1,38 +1,77 @@
 from Whittler.classes.RelevanceInterface import RelevanceInterface
+from Whittler.classes.GrowableArray import GrowableArray
 from collections import OrderedDict
+import numpy as np
 import re
 
 
-class RelevanceFilteredResultList(list, RelevanceInterface):
-    def __init__(self, iterable=None, pointer_to_me=None):
-        list.__init__(self)
+# A list of results, stored as a posting list: a sorted array of the results' ordinals in the ResultStore. The
+# result objects themselves are only looked up (or, in columnar storage mode, created) when they're accessed.
+class RelevanceFilteredResultList(RelevanceInterface):
+
+    # Lists that are buckets of a ResultDict read their relevant count from it, and other lists can keep their own
+    # count up to date in _relevant_count. Otherwise, the count is taken from the relevance bitmap on demand.
+    _bucket_owner = None
+    _bucket_id = None
+    _relevant_count = None
+
+    def __init__(self, iterable=None, pointer_to_me=None, resultstore=None, ordinals=None):
         RelevanceInterface.__init__(self, pointer_to_me)
+        self.resultstore = resultstore
+        self._ordinals = GrowableArray(np.uint32, initial_capacity=1)
         if not iterable is None:
             for e in iterable:
                 self.append(e)
+        if not ordinals is None:
+            self.extend_ordinals(ordinals)
+
+    def __getitem__(self, index):
+        return self.resultstore.give_result(self._ordinals[index])
     
     def __setitem__(self, index, value):
         assert isinstance(value, RelevanceInterface)
-        list.__setitem__(self,index,value)
+        if not self._relevant_count is None:
+            self._relevant_count += value.relevant - self[index].relevant
+        self._ordinals[index] = value._ordinal
     
     def __iter__(self):
-        yield from (e for e in self.real_iter_values() if e.relevant)
+        give_result = self.resultstore.give_result
+        yield from (give_result(ordinal) for ordinal in self.resultstore.filter_relevant(self.real_ordinals()))
     
     def __len__(self):
-        return len([e for e in self])
-    
-    # todo: speed up "result in RFRLobj" lookups - most of the time is spent checking "if result in self.results" in ResultDatabase.add_result
+        return self.relevant_length()
     
     def append(self, newitem):
         assert isinstance(newitem, RelevanceInterface)
-        list.append(self,newitem)
+        self._ordinals.append(newitem._ordinal)
+        if not self._relevant_count is None:
+            self._relevant_count += newitem.relevant
     
     def extend(self, iterable):
         for e in iterable:
             self.append(e)
+
+    # Bulk version of extend, for results that are already in the ResultStore.
+    def extend_ordinals(self, ordinals):
+        self._ordinals.extend(ordinals)
+        if not self._relevant_count is None:
+            self._relevant_count += self.resultstore.count_relevant(ordinals)
+
+    # Adds the given ordinals to this list, keeping it sorted and free of duplicates.
+    def merge_ordinals(self, ordinals):
+        ordinals = np.asarray(ordinals, dtype=np.uint32)
+        current = self._ordinals.view()
+        if not len(current) or not len(ordinals) or current[-1] < ordinals.min():
+            self.extend_ordinals(ordinals)
+            return
+        merged = np.union1d(current, ordinals)
+        if not self._relevant_count is None:
+            self._relevant_count += self.resultstore.count_relevant(merged) - self.resultstore.count_relevant(current)
+        self._ordinals = GrowableArray(np.uint32, initial_capacity=len(merged))
+        self._ordinals.extend(merged)
     
     def yield_irrelevant(self):
-        yield from (e for e in list.__iter__(self) if not e.relevant)
+        yield from (e for e in self.real_iter_values() if not e.relevant)
     
     def get_by_id(self, result_id):
         return list(filter(self.real_iter_values(),key=lambda result:str(hash(result))[:6] == result_id))[0]
@@ -43,7 +82,21 @@ class RelevanceFilteredResultList(list, RelevanceInterface):
     #
     
     def real_iter_values(self):
-        yield from list.__iter__(self)
+        give_result = self.resultstore.give_result
+        yield from (give_result(ordinal) for ordinal in self.real_ordinals())
+
+    def real_ordinals(self):
+        return self._ordinals.view()
+
+    def real_length(self):
+        return len(self._ordinals)
+
+    def relevant_length(self):
+        if not self._bucket_owner is None:
+            return int(self._bucket_owner._bucket_relevant_counts[self._bucket_id])
+        if self._relevant_count is None:
+            return RelevanceInterface.relevant_length(self)
+        return self._relevant_count
 
 
     #################################################
@@ -52,9 +105,8 @@ class RelevanceFilteredResultList(list, RelevanceInterface):
     
     def give_child_pointers(self):
         ret = OrderedDict()
-        for i in range(self.real_length()):
-            if self[i].relevant:
-                ret[i] = self.pointer_to_me.copy().get_by_index(i)
+        for i in np.flatnonzero(self.resultstore.relevance.view()[self.real_ordinals()]):
+            ret[int(i)] = self.pointer_to_me.copy().get_by_index(int(i))
         return ret
     
     def size(self):
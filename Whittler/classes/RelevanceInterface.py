@@ -1,23 +1,35 @@
 from Whittler.classes.NestedObjectPointer import NestedObjectPointerInterface
+import numpy as np
 
 
 class RelevanceInterface(NestedObjectPointerInterface):
 
+    # The ResultStore that owns the relevance bitmap for the results under this object.
+    resultstore = None
+
     @property
     def relevant(self):
-        return any(result.relevant for result in self.real_iter_values())
+        return self.relevant_length() > 0
 
     def mark_irrelevant(self):
-        for obj in self.real_iter_values():
-            obj.mark_irrelevant()
+        self.resultstore.set_relevance(self.real_ordinals(), False)
 
     def mark_relevant(self):
-        for obj in self.real_iter_values():
-            obj.mark_relevant()
+        self.resultstore.set_relevance(self.real_ordinals(), True)
 
     def real_length(self):
         return len([e for e in self.real_iter_values()])
 
+    # The number of relevant results under this object, as a popcount over the relevance bitmap.
+    def relevant_length(self):
+        return self.resultstore.count_relevant(self.real_ordinals())
+
+    # The ordinals (see ResultStore) of all results under this object, relevant or not.
+    def real_ordinals(self):
+        ordinals = [obj.real_ordinals() for obj in self.real_iter_values()]
+        if not ordinals:
+            return np.empty(0, dtype=np.uint32)
+        return np.concatenate(ordinals)
+
     def real_iter_values(self):
         raise NotImplementedError()
-
@@ -1,7 +1,14 @@
 from Whittler.classes.MemoryCompressor import MaybeCompressedString
 from Whittler.classes.RelevanceInterface import RelevanceInterface
+from Whittler.classes.NestedObjectPointer import NestedObjectPointer, ObjectView
+from Whittler.classes.IncrementalJSONReader import IncrementalJSONReader
+from Whittler.classes.ResultBatch import ResultBatch
+from Whittler.classes.json_utils import compile_field_extractor
 from collections import OrderedDict
+import numpy as np
 import hashlib
+import io
+import os
 import re
 
 
@@ -13,29 +20,124 @@ class Result(dict, RelevanceInterface):
 
     _init_run = False
 
+    # Row views (see _row_view below) keep none of the per-result bookkeeping set up in __init__, so these class-level
+    # defaults stand in for it.
+    _digest = None
+    _relevant = True
+    _store = None
+    _ordinal = None
+
     def __init__(self, resultdict=None):
         self.original_resultdict = resultdict
-        self._cached_hash = 0
-        self._cached_hash_valid = True
+        self._digest = None
         self._frozen = False
         dict.__init__(self)
         self._relevant = True
-        RelevanceInterface.__init__(self)
+        # RelevanceInterface.__init__ is deliberately not called here - there can be millions of results, so the
+        # pointer and objectview are only created when they're first used (see the properties below).
 
-        if "whittler_filename" not in self.ATTRIBUTES:
-            self.ATTRIBUTES.insert(0,"whittler_filename")
+        self._add_whittler_attributes()
         if not resultdict is None:
             for k,v in resultdict.items():
                 self[k] = v
+            self._digest = self._compute_digest()
         self._init_run = True
 
+    @classmethod
+    def _add_whittler_attributes(cls):
+        if "whittler_filename" not in cls.ATTRIBUTES:
+            cls.ATTRIBUTES.insert(0,"whittler_filename")
+        if cls._adds_source_context() and "source_context" not in cls.ATTRIBUTES:
+            cls.ATTRIBUTES.append("source_context")
+
+    # Modules whose results point at a line of a source file can set this to the names of the attributes holding the
+    # file's path and the line number, e.g. ("path", "line_number"), and pass each result dict they give through
+    # add_source_context. Then, if Config.SOURCE_CONTEXT_LINES is set, each result gets a "source_context" attribute
+    # with the lines around that line (see SourceContext).
+    SOURCE_LOCATION_ATTRIBUTES = None
+
+    @classmethod
+    def _adds_source_context(cls):
+        return not cls.SOURCE_LOCATION_ATTRIBUTES is None and not cls.Config.SOURCE_CONTEXT_LINES is None
+
+    @classmethod
+    def add_source_context(cls, resultdict):
+        if not cls._adds_source_context():
+            return resultdict
+        path_attr, line_attr = cls.SOURCE_LOCATION_ATTRIBUTES
+        try:
+            # Some tools give a range of lines, like "12-14", in which case the context is around the first one.
+            lineno = int(str(resultdict[line_attr]).split("-")[0])
+            path = str(resultdict[path_attr])
+        except (KeyError, ValueError):
+            lineno = None
+        resultdict["source_context"] = "" if lineno is None else cls.Config.SourceContext.give_context(
+            path, lineno, cls.Config.SOURCE_CONTEXT_LINES, encoding=cls.Config.FILE_ENCODING)
+        return resultdict
+
+    # Builds a standalone result straight from already stored values and their digest (see ResultBatch), without
+    # going through __setitem__ for each of them.
+    @classmethod
+    def _from_stored_values(cls, stored_values, digest):
+        ret = cls.__new__(cls)
+        ret.original_resultdict = None
+        ret._frozen = False
+        ret._relevant = True
+        dict.update(ret, stored_values)
+        ret._digest = digest
+        ret._init_run = True
+        return ret
+
+    # Once a result is added to a ResultDatabase, it is attached to a row of the database's ResultStore, which holds
+    # its relevance from then on. In columnar storage mode, the store holds its values as well, and results are
+    # represented by row views, which hold nothing but a reference to the store and the ordinal of their row.
+    def _attach(self, store, ordinal):
+        self._store = store
+        self._ordinal = ordinal
+
+    @property
+    def resultstore(self):
+        return self._store
+
+    @classmethod
+    def _row_view(cls, store, ordinal):
+        ret = cls.__new__(cls)
+        ret._attach(store, ordinal)
+        return ret
+
+    @property
+    def pointer_to_me(self):
+        if not "_pointer_to_me" in self.__dict__:
+            self._pointer_to_me = NestedObjectPointer(self)
+        return self._pointer_to_me
+
+    @pointer_to_me.setter
+    def pointer_to_me(self, pointer):
+        self._pointer_to_me = pointer
+
+    @property
+    def objectview(self):
+        if not "_objectview" in self.__dict__:
+            self._objectview = ObjectView()
+        return self._objectview
+
+    @objectview.setter
+    def objectview(self, objectview):
+        self._objectview = objectview
+
     def __setitem__(self, key, value):
+        if not self._store is None:
+            raise Exception("Cannot modify this result after it has been added to the database!")
         valtype = type(value)
         # if valtype is list:
         #     pass
         # elif valtype is dict:
         #     pass
-        if not valtype is str:
+        if isinstance(value, MaybeCompressedString):
+            # Values that modules store themselves (see MappedString) are kept as they are, unless they need filtering.
+            if self.Config.REMOVE_ANSI_CONTROL_CHARACTERS:
+                value = value.value
+        elif not valtype is str:
             value = repr(value)
         
         # This check is just for pickling/unpickling objects... the pickle implementation first calls __setitem__ with each of the
@@ -49,11 +151,105 @@ class Result(dict, RelevanceInterface):
             raise Exception("Cannot modify this result after it has been added to the database!")
         if self.Config.REMOVE_ANSI_CONTROL_CHARACTERS:
             value = self.filter_ansi(value)
-        self._cached_hash_valid = False
-        dict.__setitem__(self, key, MaybeCompressedString(value))
+        self._digest = None
+        dict.__setitem__(self, key, MaybeCompressedString(value, key))
     
     def __getitem__(self, key):
-        return dict.__getitem__(self,key).value
+        return self.stored_value(key).value
+
+    # Gives the underlying MaybeCompressedString for this attribute, whether the value lives in this result, in its
+    # joined row, or in a ResultStore.
+    def stored_value(self, key):
+        if not self._is_row_view():
+            try:
+                return dict.__getitem__(self, key)
+            except KeyError:
+                joined_row = self._joined_row()
+                if not key in joined_row:
+                    raise
+                return joined_row[key]
+        return self._store.value(self._ordinal, key)
+
+    def _is_row_view(self):
+        return not self._store is None and self._store.columnar
+
+    def __contains__(self, key):
+        if not self._is_row_view():
+            return dict.__contains__(self, key) or key in self._joined_row()
+        return self._store.has_value(self._ordinal, key)
+
+    # Attributes come in the order of ATTRIBUTES, whether the result is standalone or a row view, so that results look
+    # the same whichever way they're stored.
+    def keys(self):
+        if not self._is_row_view():
+            if self.JOIN_KEY_ATTRIBUTES is None:
+                return [attr for attr in self.ATTRIBUTES if dict.__contains__(self, attr)]
+            joined_row = self._joined_row()
+            return [attr for attr in self.ATTRIBUTES if dict.__contains__(self, attr) or attr in joined_row]
+        return [attr for attr in self.ATTRIBUTES if attr in self]
+
+    # Attributes that many results have the same values for (e.g. the attributes of the rule that a finding breaks)
+    # can be kept once per distinct key in the JOINED_ROWS table, rather than once per result. A result's key is made
+    # of its values of JOIN_KEY_ATTRIBUTES, and the attributes in the table row for its key read just like its own
+    # (a row view's are stored in the ResultStore's columns like any others). Modules that set JOIN_KEY_ATTRIBUTES
+    # have to define their own JOINED_ROWS = {}, and fill it in with add_joined_row while parsing, before yielding the
+    # results that use each row.
+    JOIN_KEY_ATTRIBUTES = None
+    JOINED_ROWS = None
+    _NO_JOINED_ROW = {}
+
+    @classmethod
+    def add_joined_row(cls, key, values):
+        cls.JOINED_ROWS[tuple(cls._clean_value(part) for part in key)] = \
+            {attr:MaybeCompressedString(cls._clean_value(value), attr) for attr,value in values.items()}
+
+    # Gives the key of the joined row for a result with the given values, or None if it's missing any of the key's
+    # attributes.
+    @classmethod
+    def _join_key(cls, values):
+        try:
+            return tuple(cls._clean_value(values[attr]) for attr in cls.JOIN_KEY_ATTRIBUTES)
+        except KeyError:
+            return None
+
+    # Turns a parsed value into the string that gets stored for it.
+    @classmethod
+    def _clean_value(cls, value):
+        if not type(value) is str:
+            value = repr(value)
+        if cls.Config.REMOVE_ANSI_CONTROL_CHARACTERS:
+            value = cls.ansi_escape.sub('', value)
+        return value
+
+    # The row's looked up once, and kept in the result from then on.
+    def _joined_row(self):
+        if self.JOIN_KEY_ATTRIBUTES is None:
+            return self._NO_JOINED_ROW
+        joined_row = self.__dict__.get("_joined")
+        if joined_row is None:
+            try:
+                key = tuple(dict.__getitem__(self, attr).value for attr in self.JOIN_KEY_ATTRIBUTES)
+            except KeyError:
+                key = None
+            joined_row = self.JOINED_ROWS.get(key, self._NO_JOINED_ROW)
+            self._joined = joined_row
+        return joined_row
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    # Results that have been added to a ResultDatabase are pickled as standalone results, and the ResultStore they
+    # point to stays behind. The pointer and objectview get recreated on first use.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Joined attributes get pickled as the result's own values, since pickling goes through items().
+        for attrname in ("_store", "_ordinal", "_pointer_to_me", "_objectview", "_joined"):
+            state.pop(attrname, None)
+        state["_relevant"] = self.relevant
+        return state
     
     # def __reduce__(self):
     #     cls = self.__class__
@@ -63,39 +259,222 @@ class Result(dict, RelevanceInterface):
     #     dict_iterator = iter({key:self.Config.MemoryCompressor.decompress(value) for key,value in dict(self).items()}.items())
     #     return (cls,args,state,list_iterator,dict_iterator)
 
+    # A 64-bit digest of this result's values, computed in a single pass over the attribute names (each prefixed with
+    # its length) and the digests of their values (see MaybeCompressedString).
+    # Joined attributes are left out, since they're determined by the values of the key attributes anyway.
+    def _compute_digest(self):
+        return self.digest_of((attr, dict.__getitem__(self, attr).digest) for attr in sorted(dict.keys(self)))
+
+    # Takes (attribute name, value digest) pairs, sorted by attribute name.
+    @staticmethod
+    def digest_of(attr_digests):
+        h = hashlib.blake2b(digest_size=8)
+        for attr, value_digest in attr_digests:
+            attr_bytes = attr.encode('utf-8')
+            h.update(len(attr_bytes).to_bytes(4,'little') + attr_bytes + value_digest.to_bytes(8,'little'))
+        return int.from_bytes(h.digest(),'little')
+
+    @property
+    def digest(self):
+        if self._is_row_view():
+            return int(self._store.digests[self._ordinal])
+        if self._digest is None:
+            self._digest = self._compute_digest()
+        return self._digest
+
     def __hash__(self):
-        if self._cached_hash_valid:
-            return self._cached_hash
-        new_hashval = 0
-        for attr in sorted(self.ATTRIBUTES):
-            if attr in self:
-                # TODO: faster to hash the compressed values if memory compression enabled, would that break anything?
-                new_hashval = int(hashlib.md5(bytes(str(new_hashval)+attr+self[attr],'utf-8')).hexdigest(),16)
-        self._cached_hash = new_hashval
-        self._cached_hash_valid = True
-        return new_hashval
+        return self.digest
     
+    # Digests are only 64 bits wide, so results with equal digests have their values compared as well.
     def __eq__(self, other):
         if not isinstance(other, Result):
             return False
-        return hash(self) == hash(other)
+        if self.digest != other.digest:
+            return False
+        keys = sorted(self.keys())
+        if keys != sorted(other.keys()):
+            return False
+        for attr in keys:
+            value, other_value = self.stored_value(attr), other.stored_value(attr)
+            if not value is other_value and value.value != other_value.value:
+                return False
+        return True
     
     def items(self):
-        for k in dict.keys(self):
+        for k in self.keys():
             yield (k,self[k])
     
     @staticmethod
     def give_result_dict_list(fname):
         raise NotImplementedError()
+
+    # Modules can implement this instead of give_result_dict_list, as a generator that yields the result dicts one at a
+    # time, so that the whole file never has to be held in memory as a list of dicts. Modules that open their files
+    # with open_for_parsing get their parsing progress reported by how far into the file they've read.
+    @classmethod
+    def give_result_dict_iter(cls, fname):
+        if cls.FIELD_MAP is None:
+            yield from cls.give_result_dict_list(fname)
+            return
+        extract = cls._give_field_extractor()
+        if extract.parent_keys:
+            resultdicts = (extract(value, parents)
+                           for value, parents in cls.iter_json_path(fname, cls.JSON_RESULTS_PATH, with_parents=True,
+                                                                    parent_keys=extract.parent_keys))
+        else:
+            resultdicts = map(extract, cls.iter_json_path(fname, cls.JSON_RESULTS_PATH))
+        if cls._adds_source_context():
+            resultdicts = map(cls.add_source_context, resultdicts)
+        yield from resultdicts
+
+    # Modules for tools that output JSON can describe where each attribute is found instead of implementing either of
+    # the above: JSON_RESULTS_PATH is the path of the array of results in the file, e.g. "results[]" (see
+    # IncrementalJSONReader), and FIELD_MAP maps each attribute to the path of its value in each result, e.g.
+    # "extra.severity", or to a (path, default) tuple for values that may be missing (see compile_field_extractor).
+    # ATTRIBUTES defaults to the attributes in FIELD_MAP, in the same order.
+    JSON_RESULTS_PATH = None
+    FIELD_MAP = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if not cls.__dict__.get("FIELD_MAP") is None and not "ATTRIBUTES" in cls.__dict__:
+            cls.ATTRIBUTES = list(cls.FIELD_MAP)
+
+    # The field map is compiled the first time each process parses a file with it.
+    @classmethod
+    def _give_field_extractor(cls):
+        extract = cls.__dict__.get("_field_extractor")
+        if extract is None:
+            extract = compile_field_extractor(cls.FIELD_MAP)
+            cls._field_extractor = extract
+        return extract
     
     @classmethod
     def _give_result_dict_list(cls, fname):
-        ret = cls.give_result_dict_list(fname)
-        for resultdict in ret:
+        ret = []
+        for resultdict in cls.give_result_dict_iter(fname):
             resultdict["whittler_filename"] = fname
-        ret = [cls(result) for result in ret]
-        _ = [hash(r) for r in ret] # cache the hashes (speeds things up during multiprocessing)
+            ret.append(cls(resultdict))
         return ret
+
+    # The worker side of parsing files in parallel: parses the results in one file into a list of ResultBatches,
+    # going through the ParsedFileCache if one is given.
+    @classmethod
+    def _give_result_batches(cls, task):
+        fname, deduplicate, parsed_file_cache = task
+        if parsed_file_cache is None:
+            return [cls._fill_result_batch(cls.give_result_dict_iter(fname), fname, deduplicate)]
+        cache_key = parsed_file_cache.entry_key(cls, fname)
+        batches = parsed_file_cache.load(cls, fname, deduplicate)
+        if batches is None:
+            batches = [cls._fill_result_batch(cls.give_result_dict_iter(fname), fname, deduplicate)]
+            parsed_file_cache.store(cls, fname, deduplicate, batches, cache_key)
+        return batches
+
+    @classmethod
+    def _fill_result_batch(cls, resultdicts, fname, deduplicate):
+        batch = ResultBatch(cls, deduplicate=deduplicate)
+        for resultdict in resultdicts:
+            resultdict["whittler_filename"] = fname
+            batch.add(resultdict)
+        return batch.finish()
+
+    # When parsing a directory, only the files matching one of these glob patterns (and none of the excluded ones) are
+    # parsed, and excluded directories are skipped entirely. Patterns with a "/" in them are matched against the path
+    # relative to the directory, and the others against the file or directory name (see FileDiscovery).
+    FILE_INCLUDE_GLOBS = ["*"]
+    FILE_EXCLUDE_GLOBS = []
+
+    # Modules whose files are made up of independent records (e.g. lines) can set this to a regex (as bytes) matching
+    # the end of a record, and implement give_result_dict_iter_range, so that large files can be split into chunks at
+    # record boundaries and the chunks parsed in parallel (see ResultDatabase.parse_from_file).
+    RECORD_BOUNDARY = None
+
+    # Like give_result_dict_iter, but only for the records in the given byte range of the file, which always starts
+    # and ends at record boundaries.
+    @staticmethod
+    def give_result_dict_iter_range(fname, start, end):
+        raise NotImplementedError()
+
+    # Splits the file into (start, end) byte ranges of roughly chunk_bytes each, ending at record boundaries.
+    @classmethod
+    def give_record_ranges(cls, fname, chunk_bytes):
+        boundary = re.compile(cls.RECORD_BOUNDARY)
+        size = os.path.getsize(fname)
+        ranges = []
+        start = 0
+        with open(fname, "rb") as f:
+            while size-start > chunk_bytes:
+                window_start = start+chunk_bytes
+                f.seek(window_start)
+                window = b""
+                end = None
+                while end is None:
+                    data = f.read(2**16)
+                    if not data:
+                        break
+                    window += data
+                    match = boundary.search(window)
+                    # A match that runs up to the end of the window might continue past it.
+                    if not match is None and match.end() < len(window):
+                        end = window_start+match.end()
+                if end is None:
+                    break
+                ranges.append((start, end))
+                start = end
+        ranges.append((start, size))
+        return ranges
+
+    # The worker side of parsing a file in parallel: parses the results in one byte range of it into a ResultBatch.
+    @classmethod
+    def _give_result_batch_for_range(cls, task):
+        fname, start, end, deduplicate = task
+        return cls._fill_result_batch(cls.give_result_dict_iter_range(fname, start, end), fname, deduplicate)
+
+    # The files that results are currently being parsed from (see open_for_parsing), by filename.
+    _files_being_parsed = {}
+
+    # Opens a file to parse results from, just like open() does, and keeps track of it for progress reporting.
+    @staticmethod
+    def open_for_parsing(fname, *args, **kwargs):
+        f = open(fname, *args, **kwargs)
+        Result._files_being_parsed[fname] = f
+        return f
+
+    # Gives the fraction of the file that has been read so far by the module parsing it, or None if that isn't known.
+    @staticmethod
+    def parsing_progress(fname):
+        f = Result._files_being_parsed.get(fname)
+        if f is None:
+            return None
+        try:
+            size = os.fstat(f.fileno()).st_size
+            # Text files can't tell() while they're being iterated over, but their underlying binary buffer can.
+            position = getattr(f, "buffer", f).tell()
+        except (ValueError, OSError):
+            # The file has already been closed.
+            return None
+        return position/size if size else None
+
+    @staticmethod
+    def done_parsing(fname):
+        Result._files_being_parsed.pop(fname, None)
+
+    # Gives a text file object over just the given byte range of the file, for give_result_dict_iter_range.
+    @staticmethod
+    def open_range_for_parsing(fname, start, end, encoding=None):
+        with open(fname, "rb") as f:
+            f.seek(start)
+            data = f.read(end-start)
+        return io.TextIOWrapper(io.BytesIO(data), encoding=encoding)
+
+    # Yields the elements of the array at the given path in a JSON file one at a time, e.g. "results[]" or
+    # "Results[].Vulnerabilities[]" (see IncrementalJSONReader), without loading the whole file. Any keyword arguments
+    # are passed on to open_for_parsing (e.g. encoding).
+    @staticmethod
+    def iter_json_path(fname, path, with_parents=False, parent_keys=None, **kwargs):
+        with Result.open_for_parsing(fname, "r", **kwargs) as f:
+            yield from IncrementalJSONReader(f).iter_path(path, with_parents=with_parents, parent_keys=parent_keys)
     
     # https://stackoverflow.com/questions/14693701/how-can-i-remove-the-ansi-escape-sequences-from-a-string-in-python
     ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
@@ -147,7 +526,7 @@ class Result(dict, RelevanceInterface):
         print(self.pretty_repr())
     
     def __repr__(self):
-        return f"{self.__class__.__name__}({dict.__repr__(self)})"
+        return f"{self.__class__.__name__}({ {k:self.stored_value(k) for k in self.keys()} })"
     
 
     #######################################
@@ -156,16 +535,27 @@ class Result(dict, RelevanceInterface):
 
     @property
     def relevant(self):
-        return self._relevant
+        if self._store is None:
+            return self._relevant
+        return self._store.is_relevant(self._ordinal)
     
     def mark_irrelevant(self):
-        self._relevant = False
+        if self._store is None:
+            self._relevant = False
+        else:
+            self._store.set_relevance([self._ordinal], False)
 
     def mark_relevant(self):
-        self._relevant = True
+        if self._store is None:
+            self._relevant = True
+        else:
+            self._store.set_relevance([self._ordinal], True)
     
     def real_iter_values(self):
         return [self]
+
+    def real_ordinals(self):
+        return np.array([self._ordinal], dtype=np.uint32)
     
 
     #################################################
@@ -0,0 +1,113 @@
+from Whittler.classes.MemoryCompressor import MaybeCompressedString
+from Whittler.classes.ResultStore import MISSING
+import numpy as np
+
+
+# The results parsed from one file (or one chunk of a file) by a worker process, in a compact form that's cheap to
+# send back to the main process and cheap to merge into a ResultDatabase there (see ResultDatabase.add_result_batch).
+#
+# The values of each attribute are dictionary-encoded: each distinct value is sent once, along with its digest, and
+# every result is a row of value codes, along with its own digest (see Result.digest). With deduplicate set,
+# duplicate results are dropped as they're added, so only distinct results are sent back at all.
+class ResultBatch:
+    def __init__(self, result_class, deduplicate=False):
+        self.result_class = result_class
+        self.deduplicate = deduplicate
+        # The attribute names, in the order they were first seen, and per attribute, its distinct values along with
+        # their digests (see MaybeCompressedString.digest).
+        self.attributes = []
+        self.values = []
+        self.value_digests = []
+        # One row of value codes and one digest per result. These are lists while the batch is being built, and
+        # become numpy arrays once it's finished.
+        self.codes = []
+        self.digests = []
+        # The joined rows used by the results in the batch (see Result.JOIN_KEY_ATTRIBUTES), by key, as plain strings.
+        self.joined_rows = {}
+        self._attribute_indexes = {}
+        self._value_codes = []
+        self._rows_by_digest = {}
+
+    def __len__(self):
+        return len(self.digests)
+
+    # Takes a result dict, just like the constructor of the result class does.
+    def add(self, resultdict):
+        result_class = self.result_class
+        # Just like in Result.__init__, not before the first result is added, since some modules only fill in their
+        # ATTRIBUTES while parsing (see the pssa_csv module).
+        result_class._add_whittler_attributes()
+        row = {}
+        for attr, value in resultdict.items():
+            if isinstance(value, MaybeCompressedString):
+                # Values that modules store themselves (see MappedString) are sent as they are.
+                if result_class.Config.REMOVE_ANSI_CONTROL_CHARACTERS:
+                    value = value.value
+            elif not type(value) is str:
+                value = repr(value)
+            if attr not in result_class.ATTRIBUTES:
+                raise Exception(f"Unrecognized key {attr} in this result.")
+            if result_class.Config.REMOVE_ANSI_CONTROL_CHARACTERS:
+                value = result_class.ansi_escape.sub('', value)
+            index = self._attribute_index(attr)
+            row[index] = self._value_code(index, value)
+        digest = result_class.digest_of(
+            (self.attributes[i], self.value_digests[i][row[i]]) for i in sorted(row, key=self.attributes.__getitem__))
+        if self.deduplicate:
+            if self._rows_by_digest.get(digest) == row:
+                return
+            self._rows_by_digest.setdefault(digest, row)
+        self.codes.append(row)
+        self.digests.append(digest)
+        if not result_class.JOIN_KEY_ATTRIBUTES is None:
+            key = result_class._join_key(resultdict)
+            if not key in self.joined_rows and key in result_class.JOINED_ROWS:
+                self.joined_rows[key] = {attr:value.value for attr,value in result_class.JOINED_ROWS[key].items()}
+
+    def _attribute_index(self, attr):
+        index = self._attribute_indexes.get(attr)
+        if index is None:
+            index = len(self.attributes)
+            self._attribute_indexes[attr] = index
+            self.attributes.append(attr)
+            self.values.append([])
+            self.value_digests.append([])
+            self._value_codes.append({})
+        return index
+
+    def _value_code(self, index, value):
+        value_codes = self._value_codes[index]
+        code = value_codes.get(value)
+        if code is None:
+            code = len(self.values[index])
+            value_codes[value] = code
+            self.values[index].append(value)
+            self.value_digests[index].append(value.digest if isinstance(value, MaybeCompressedString)
+                                             else MaybeCompressedString.digest_of(value.encode('utf-8')))
+        return code
+
+    # Packs the rows into arrays, and drops everything that was only needed while adding results.
+    def finish(self):
+        codes = np.full((len(self.codes), len(self.attributes)), MISSING, dtype=np.uint32)
+        for i, row in enumerate(self.codes):
+            codes[i, list(row.keys())] = list(row.values())
+        self.codes = codes
+        self.digests = np.array(self.digests, dtype=np.uint64)
+        self.value_digests = [np.array(value_digests, dtype=np.uint64) for value_digests in self.value_digests]
+        self._attribute_indexes = {}
+        self._value_codes = []
+        self._rows_by_digest = {}
+        return self
+
+    # The result class is only needed while adding results, and is left out so that batches can be unpickled without
+    # having the module loaded (e.g. from a ParsedFileCache).
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["result_class"] = None
+        return state
+
+    # Gives the stored values of the batch, as a MaybeCompressedString per distinct value per attribute. These are
+    # interned like any other value, so values the database already has are shared rather than stored again.
+    def give_stored_values(self):
+        return [[MaybeCompressedString(value, attr, int(digest)) for value, digest in zip(values, value_digests)]
+            for attr, values, value_digests in zip(self.attributes, self.values, self.value_digests)]
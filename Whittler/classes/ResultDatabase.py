@@ -1,8 +1,13 @@
 from Whittler.classes.Result import Result
+from Whittler.classes.ResultStore import ResultStore, MISSING
+from Whittler.classes.ResultBatch import ResultBatch
+from Whittler.classes.FileDiscovery import FileDiscovery
+from Whittler.classes.Snapshot import Snapshot
 from Whittler.classes.RelevanceInterface import RelevanceInterface
 from Whittler.classes.ResultDictContainer import ResultDictContainer
 from Whittler.classes.RelevanceFilteredResultList import RelevanceFilteredResultList
 from Whittler.classes.input_utils import wprint
+from Whittler.classes.export_utils import read_export_header
 from Whittler.config import Config
 from collections import OrderedDict
 import time
@@ -31,12 +36,16 @@ class ResultDatabase(RelevanceInterface):
         RelevanceInterface.__init__(self, pointer_to_me)
 
         self.result_class = result_class
+        self.resultstore = ResultStore(result_class)
 
         result_pointer = self.pointer_to_me.copy().access_property("results")
-        self.results = RelevanceFilteredResultList(pointer_to_me=result_pointer)
+        self.results = RelevanceFilteredResultList(pointer_to_me=result_pointer, resultstore=self.resultstore)
+        self.results._relevant_count = 0
+        self.resultstore.add_relevance_listener(self._relevance_changed)
 
         categorized_results_pointer = self.pointer_to_me.copy().access_property("categorized_results")
-        self.categorized_results = ResultDictContainer(self, pointer_to_me=categorized_results_pointer)
+        self.categorized_results = ResultDictContainer(self, pointer_to_me=categorized_results_pointer,
+                                                       keyed_by_attribute=True)
 
         grouped_results_pointer = self.pointer_to_me.copy().access_property("grouped_results")
         self.grouped_results = ResultDictContainer(self, pointer_to_me=grouped_results_pointer)
@@ -44,26 +53,85 @@ class ResultDatabase(RelevanceInterface):
         self.current_pointer = self.pointer_to_me.copy()
         self.context_pointers = OrderedDict()
 
+        # If set, files are parsed through this ParsedFileCache, and unchanged files are loaded from it instead.
+        self.parsed_file_cache = None
+
         # self.pr = cProfile.Profile()
     
     def __getitem__(self, nestedobjectpointer):
         assert nestedobjectpointer.base_object is self
         return nestedobjectpointer.give_pointed_object()
 
-    def add_result(self, result, lookup_set=None):
-        assert isinstance(result,self.result_class)
-        if lookup_set is None:
-            pass
-        else:
-            result_hash = hash(result)
-            if result_hash in lookup_set:
-                return
-            lookup_set.add(result_hash)
-        result._frozen = True
-        self.results.append(result)
-        for attr in self.result_class.ATTRIBUTES:
-            attrval = dict.__getitem__(result, attr) # gets the underlying CompressedBytes object if memory compression enabled
-            self.categorized_results[attr][attrval].append(result)
+    def give_result(self, ordinal):
+        return self.resultstore.give_result(int(ordinal))
+
+    # Gives the ordinals of the relevant results (or all results, if relevant_only is False) whose value for
+    # attrname satisfies the predicate. The predicate is evaluated once per distinct value rather than once per result.
+    def find_matching_ordinals(self, attrname, predicate, relevant_only=True):
+        ordinals = self.resultstore.ordinals_where(attrname, predicate)
+        if relevant_only:
+            ordinals = self.resultstore.filter_relevant(ordinals)
+        return ordinals
+
+    # If lookup_dict is given, it maps the digest of each result added so far to the result's ordinal, and results that
+    # are already in it are skipped.
+    def add_result(self, result, lookup_dict=None):
+        self.add_results([result], lookup_dict=lookup_dict)
+
+    # Bulk version of add_result, which stores a whole list of results at once, and then updates the result list and
+    # every categorized index once for the lot of them. Results that are duplicates of each other are skipped too.
+    def add_results(self, results, lookup_dict=None):
+        assert all(isinstance(result,self.result_class) for result in results)
+        if not lookup_dict is None:
+            results = self._drop_known_results(results, lookup_dict)
+        if not results:
+            return
+        first_ordinal = self.resultstore.extend(results)
+        ordinals = np.arange(first_ordinal, first_ordinal+len(results), dtype=np.uint32)
+        self.results.extend_ordinals(ordinals)
+        # Categorized indexes are only built once they're needed (see ResultDict), and only the ones that already
+        # exist are kept up to date here.
+        for resultdict in self.categorized_results.indexed_resultdicts:
+            resultdict.add_ordinals(ordinals)
+
+    # Gives the results that aren't in lookup_dict yet, and adds them to it, under the ordinals they're about to be
+    # stored at.
+    def _drop_known_results(self, results, lookup_dict):
+        first_ordinal = len(self.resultstore)
+        new_results = []
+        for result in results:
+            digest = result.digest
+            ordinal = lookup_dict.get(digest)
+            if ordinal is None:
+                lookup_dict[digest] = first_ordinal+len(new_results)
+            elif ordinal < first_ordinal:
+                if self.give_result(ordinal) == result:
+                    continue
+            elif new_results[ordinal-first_ordinal] == result:
+                continue
+            new_results.append(result)
+        return new_results
+
+    # Merges a ResultBatch parsed by a worker process (see Result._give_result_batch). Its values and digests come
+    # precomputed, so nothing is hashed again here.
+    def add_result_batch(self, batch, lookup_dict=None):
+        self.result_class._add_whittler_attributes()
+        # Attributes can be discovered while parsing (see the sarif module), which only happened in the worker.
+        for attr in (*batch.attributes, *(attr for values in batch.joined_rows.values() for attr in values)):
+            if attr not in self.result_class.ATTRIBUTES:
+                self.result_class.ATTRIBUTES.append(attr)
+        for key, values in batch.joined_rows.items():
+            self.result_class.add_joined_row(key, values)
+        attributes = batch.attributes
+        stored_values = batch.give_stored_values()
+        from_stored_values = self.result_class._from_stored_values
+        self.add_results([from_stored_values({attributes[i]:stored_values[i][code] for i,code in enumerate(row)
+                                              if code != MISSING}, digest)
+                          for row, digest in zip(batch.codes.tolist(), batch.digests.tolist())],
+                         lookup_dict=lookup_dict)
+
+    def _relevance_changed(self, ordinals, relevant):
+        self.results._relevant_count += len(ordinals) if relevant else -len(ordinals)
 
 
     #########################
@@ -118,137 +186,196 @@ class ResultDatabase(RelevanceInterface):
         dist_sum = dl_exp+sm_exp
         return np.power(dist_sum,1/exp)
     
+    @staticmethod
+    def _compute_distances_for_chunk(task):
+        reference, values, exp = task
+        return ResultDatabase.compute_distances(reference, values, exp)
+
+    # With multiprocessing enabled, the distances to this many values or more are computed by the worker pool, in
+    # chunks of SIMILARITY_CHUNK_VALUES values.
+    PARALLEL_SIMILARITY_MIN_VALUES = 20000
+    SIMILARITY_CHUNK_VALUES = 2000
     def find_similar_results(self, attrname, groupval):
         if not groupval.strip():
-            all_results = (res[attrname].strip() for res in list.__iter__(self.results) if hasattr(res,attrname) and res[attrname].strip())
+            all_results = (res[attrname].strip() for res in self.results.real_iter_values() if hasattr(res,attrname) and res[attrname].strip())
         else:
-            all_results = (res[attrname].strip() for res in list.__iter__(self.results))
-        return list(zip(self.results,self.compute_distances(groupval, all_results)))
+            all_results = (res[attrname].strip() for res in self.results.real_iter_values())
+        if Config.MULTIPROCESSING:
+            all_results = list(all_results)
+        if not Config.MULTIPROCESSING or len(all_results) < self.PARALLEL_SIMILARITY_MIN_VALUES:
+            return list(zip(self.results.real_iter_values(),self.compute_distances(groupval, all_results)))
+        chunks = (all_results[i:i+self.SIMILARITY_CHUNK_VALUES]
+                  for i in range(0, len(all_results), self.SIMILARITY_CHUNK_VALUES))
+        distances = np.concatenate(list(Config.WorkerPool.imap(self._compute_distances_for_chunk,
+            (((groupval, chunk, Config.SIMILARITY_EXPONENT), sum(len(val) for val in chunk)) for chunk in chunks))))
+        return list(zip(self.results.real_iter_values(),distances))
     
-    def register_grouped_results(self, attrname, groupval, result_group):
-        for result in result_group:
-            attrval = dict.__getitem__(result, attrname) # gets the underlying CompressedBytes object if memory compression enabled
-            self.grouped_results[groupval][attrval].append(result)
+    # Groups the results with the given ordinals under groupval, in buckets keyed by their value of attrname.
+    def register_grouped_results(self, attrname, groupval, ordinals):
+        if not len(ordinals):
+            return
+        self.grouped_results[groupval].add_group_members(ordinals, attrname)
 
 
     #################################
     #  Input file parsing functions
     #
 
-    def parse_from_file(self,fname,hash_cache=None):
-        result_dict_list = self.result_class.give_result_dict_list(fname)
+    # Parsed and imported results are added to the database in lists of up to this many (see add_results).
+    RESULTS_PER_INSERT = 10000
+
+    def parse_from_file(self,fname,hash_cache=None,multiprocessing_import=False):
+        deduplicate = not hash_cache is None
+        cache = self.parsed_file_cache
+        # The parsed results are only collected into batches if they're going to be cached.
+        batches = None
+        if not cache is None:
+            cache_key = cache.entry_key(self.result_class, fname)
+            cached_batches = cache.load(self.result_class, fname, deduplicate)
+            if not cached_batches is None:
+                for batch in cached_batches:
+                    self.add_result_batch(batch, lookup_dict=hash_cache)
+                return
+            batches = []
+        if multiprocessing_import and not self.result_class.RECORD_BOUNDARY is None and \
+                os.path.getsize(fname) > 2*Config.PARALLEL_PARSE_CHUNK_BYTES:
+            self.parse_from_file_in_parallel(fname, hash_cache=hash_cache, batches=batches)
+        else:
+            self._parse_from_file_serially(fname, hash_cache=hash_cache, batches=batches)
+        if not cache is None:
+            cache.store(self.result_class, fname, deduplicate, batches, cache_key)
+
+    def _parse_from_file_serially(self,fname,hash_cache=None,batches=None):
+        result_dict_iter = self.result_class.give_result_dict_iter(fname)
+        batch = None if batches is None else ResultBatch(self.result_class, deduplicate=not hash_cache is None)
+        pending_results = []
+        last_report = time.time()
+        start = last_report
+        ct = 0
+        parsing_str = f"PARSING {fname} : "
+        longest_str_length = 0
+        try:
+            for resultdict in result_dict_iter:
+                cur_time = time.time()
+                if cur_time-last_report > 5:
+                    progress = self.result_class.parsing_progress(fname)
+                    progress_str = "" if progress is None else f"{int(progress*100)}% done "
+                    print_str = f"{parsing_str}{progress_str}({ct} results so far)"
+                    if len(print_str)>longest_str_length:
+                        longest_str_length = len(print_str)
+                    wprint(print_str, end='\r')
+                    last_report = cur_time
+                resultdict["whittler_filename"] = fname
+                if batch is None:
+                    pending_results.append(self.result_class(resultdict))
+                    if len(pending_results) >= self.RESULTS_PER_INSERT:
+                        self.add_results(pending_results, lookup_dict=hash_cache)
+                        pending_results = []
+                else:
+                    batch.add(resultdict)
+                ct += 1
+        finally:
+            self.result_class.done_parsing(fname)
+        self.add_results(pending_results, lookup_dict=hash_cache)
+        if not batch is None:
+            batches.append(batch.finish())
+            self.add_result_batch(batch, lookup_dict=hash_cache)
+        if longest_str_length:
+            timing = "{:.2f}".format(time.time()-start)
+            final_report = f"{parsing_str}Done (took {timing}s)"
+            wprint(final_report + " "*(len(final_report)-max(Config.MAX_OUTPUT_WIDTH,longest_str_length)))
+
+    # Splits the file into chunks at record boundaries (see Result.RECORD_BOUNDARY), and parses them in a process
+    # pool. The results of each chunk are added in file order. If batches is given, the batch parsed from each chunk
+    # is appended to it.
+    def parse_from_file_in_parallel(self,fname,hash_cache=None,batches=None):
+        ranges = self.result_class.give_record_ranges(fname, Config.PARALLEL_PARSE_CHUNK_BYTES)
         last_report = time.time()
         start = last_report
         ct = 0
         parsing_str = f"PARSING {fname} : "
         longest_str_length = 0
-        for resultdict in result_dict_list:
+        batch_generator = Config.WorkerPool.imap(self.result_class._give_result_batch_for_range,
+            (((fname, range_start, range_end, not hash_cache is None), range_end-range_start)
+                for range_start, range_end in ranges))
+        for batch in batch_generator:
             cur_time = time.time()
             if cur_time-last_report > 5:
-                print_str = f"{parsing_str}{(int((ct/len(result_dict_list)*100)))}% done ({ct} out of {len(result_dict_list)})"
+                print_str = f"{parsing_str}{(int((ct/len(ranges)*100)))}% done ({ct} out of {len(ranges)} chunks)"
                 if len(print_str)>longest_str_length:
                     longest_str_length = len(print_str)
                 wprint(print_str, end='\r')
                 last_report = cur_time
-            resultdict["whittler_filename"] = fname
-            self.add_result(self.result_class(resultdict), lookup_set=hash_cache)
+            self.add_result_batch(batch, lookup_dict=hash_cache)
+            if not batches is None:
+                batches.append(batch)
             ct += 1
         if longest_str_length:
             timing = "{:.2f}".format(time.time()-start)
             final_report = f"{parsing_str}Done (took {timing}s)"
             wprint(final_report + " "*(len(final_report)-max(Config.MAX_OUTPUT_WIDTH,longest_str_length)))
 
+    # Parses every matching file under the directory, recursively (see Result.FILE_INCLUDE_GLOBS). Parsing starts as
+    # soon as the first files are found.
     def parse_from_directory(self,dirname,hash_cache=None,multiprocessing_import=False):
-        files = os.listdir(dirname)
+        discovery = FileDiscovery(self.result_class.FILE_INCLUDE_GLOBS, self.result_class.FILE_EXCLUDE_GLOBS,
+                                  threads=Config.DISCOVERY_THREADS, window_size=Config.DISCOVERY_WINDOW_SIZE)
+        found = 0
+        def count_found(files):
+            nonlocal found
+            for fname, size in files:
+                found += 1
+                yield fname, size
+        if multiprocessing_import:
+            # The pool has to be started before the discovery threads are.
+            Config.WorkerPool.start()
+        files = count_found(discovery.iter_files(dirname, with_sizes=True))
         last_report = time.time()
         start = last_report
         ct = 0
         parsing_str = f"FILES PARSED: "
         longest_str_length = 0
         wprint(f"Parsing from {dirname} ...")
-        try:
-            if multiprocessing_import:
-                import multiprocessing as mp
-                p = mp.Pool()
-                # # do this to support KeyboardInterrupt
-                # # https://stackoverflow.com/questions/1408356/keyboard-interrupts-with-pythons-multiprocessing-pool
-                # resultdictlist_generator = (resultdict for resultdict in p.map_async(
-                #     self.result_class._give_result_dict_list,
-                #     (dirname+"/"+fname for fname in files),
-                #     chunksize=20).get(999999))
-                resultdictlist_generator = p.imap_unordered(
-                    self.result_class._give_result_dict_list,
-                    (dirname+"/"+fname for fname in files),
-                    chunksize=20)
-                p.close()
-            else:
-                resultdictlist_generator = (self.parse_from_file(dirname+"/"+fname, hash_cache=hash_cache) for fname in files)
-            for resultdictlist in resultdictlist_generator:
-                cur_time = time.time()
-                if cur_time-last_report > 5:
-                    print_str = f"{parsing_str}{(int((ct/len(files)*100)))}% ({ct} out of {len(files)})"
-                    if len(print_str)>longest_str_length:
-                        longest_str_length = len(print_str)
-                    wprint(print_str, end='\r')
-                    last_report = cur_time
-                if multiprocessing_import:
-                    for result in resultdictlist:
-                        self.add_result(result, lookup_set=hash_cache)
-                ct += 1
-        finally:
+        if multiprocessing_import:
+            resultdictlist_generator = Config.WorkerPool.imap_unordered(self.result_class._give_result_batches,
+                (((fname, not hash_cache is None, self.parsed_file_cache), size) for fname, size in files))
+        else:
+            resultdictlist_generator = (self.parse_from_file(fname, hash_cache=hash_cache) for fname, _ in files)
+        for resultdictlist in resultdictlist_generator:
+            cur_time = time.time()
+            if cur_time-last_report > 5:
+                print_str = f"{parsing_str}{ct} ({found} found so far)"
+                if len(print_str)>longest_str_length:
+                    longest_str_length = len(print_str)
+                wprint(print_str, end='\r')
+                last_report = cur_time
             if multiprocessing_import:
-                p.terminate()
+                for batch in resultdictlist:
+                    self.add_result_batch(batch, lookup_dict=hash_cache)
+            ct += 1
         timing = "{:.2f}".format(time.time()-start)
-        final_report = f"Parsing from {dirname} done (took {timing}s)"
+        final_report = f"Parsing {ct} files from {dirname} done (took {timing}s)"
         wprint(final_report + " "*(len(final_report)-max(Config.MAX_OUTPUT_WIDTH,longest_str_length)))
     
     def parse_from_export(self,fname,hash_cache=None):
+        if Snapshot.is_snapshot(fname):
+            self.parse_from_snapshot(fname, hash_cache=hash_cache)
+            return
         importing_str = f"IMPORTING {os.path.basename(fname)} ... "
         last_report = time.time()
         start = last_report
         wprint(f"{importing_str}", end='\r')
-        pickle_import = False
+        with gzip.GzipFile(fname, "rb") as f:
+            header = read_export_header(f)
         # self.pr.enable()
-        try:
-            try:
-                with gzip.GzipFile(fname, "rb") as f:
-                    pickle.load(f)
-                def result_gen():
-                    with gzip.GzipFile(fname, "rb") as f:
-                        while True:
-                            try:
-                                yield pickle.load(f)
-                            except EOFError:
-                                break
-                results = result_gen()
-                results_len = None
-                pickle_import = True
-            except pickle.UnpicklingError:
-                try:
-                    with gzip.GzipFile(fname, "rb") as f:
-                        results = json.loads(f.read().decode('utf-8'))
-                        results_len = len(results)
-                except json.decoder.JSONDecodeError:
-                    raise Exception("Failed to import file as either binary (pickle) or JSON data.")
-        except:
-            raise
+        if header is None:
+            results, results_len, pickle_import = self._give_headerless_export_results(fname)
+        else:
+            results, results_len, pickle_import = self._give_export_results(fname, header)
         # self.pr.disable()
-        # If we're importing from JSON, we need to make sure that the data keys are compatible with the specified module
-        if not pickle_import:
-            first_result_keys = set(results[0].keys())
-            for result in results:
-                if first_result_keys ^ set(result.keys()): # check symmetric difference, basically ensure that they're equal
-                    raise Exception(f"invalid Whittler export file {fname} ... all results dicts in the JSON must have the same "+\
-                                    f"set of keys, but the keys in the result:\n{result}\ndid not match the expected keys:\n"+\
-                                    f"{first_result_keys}")
-            if not isinstance(self.result_class.ATTRIBUTES, list):
-                self.result_class.ATTRIBUTES = []
-            attrs = self.result_class.ATTRIBUTES
-            for key in results[0].keys(): # don't use first_result_keys because the json is ordered whereas sets are not
-                if key not in attrs:
-                    attrs.append(key)
         ct = 0
         biggest_status_str_len = 0
+        pending_results = []
         for result in results:
             cur_time = time.time()
             if cur_time-last_report > 5:
@@ -261,11 +388,12 @@ class ResultDatabase(RelevanceInterface):
                     biggest_status_str_len = len(status_str)
                 wprint(status_str, end='\r')
                 last_report = cur_time
-            if pickle_import:
-                self.add_result(result, lookup_set=hash_cache)
-            else:
-                self.add_result(self.result_class(result), lookup_set=hash_cache)
+            pending_results.append(result if pickle_import else self.result_class(result))
+            if len(pending_results) >= self.RESULTS_PER_INSERT:
+                self.add_results(pending_results, lookup_dict=hash_cache)
+                pending_results = []
             ct += 1
+        self.add_results(pending_results, lookup_dict=hash_cache)
         # s = io.StringIO()
         # sortby = SortKey.CUMULATIVE
         # ps = pstats.Stats(self.pr, stream=s).sort_stats(sortby)
@@ -276,12 +404,196 @@ class ResultDatabase(RelevanceInterface):
         wprint(done_str+" "*max(biggest_status_str_len,Config.MAX_OUTPUT_WIDTH-len(done_str)))
 
 
+    # Gives (results, results_len, pickle_import) for an export with a header (see export_utils), whose format, module
+    # and record count are known before reading any of the results. JSON exports hold one result per line, so they're
+    # decoded one at a time, just like pickle exports.
+    def _give_export_results(self,fname,header):
+        pickle_import = header["format"] == "pickle"
+        if not header["format"] in ("pickle", "json"):
+            raise Exception(f"invalid Whittler export file {fname} ... unknown export format {header['format']}")
+        if pickle_import and header["module"] != self.result_class.FRIENDLY_NAME:
+            raise Exception(f"{fname} holds {header['module']} results, which can't be imported with the "+\
+                            f"{self.result_class.FRIENDLY_NAME} module.")
+        if not isinstance(self.result_class.ATTRIBUTES, list):
+            self.result_class.ATTRIBUTES = []
+        self.result_class._add_whittler_attributes()
+        attrs = self.result_class.ATTRIBUTES
+        for attr in header["attributes"]:
+            if attr not in attrs:
+                attrs.append(attr)
+        expected_keys = set(header["attributes"])
+        def result_gen():
+            with gzip.GzipFile(fname, "rb") as f:
+                read_export_header(f)
+                if pickle_import:
+                    while True:
+                        try:
+                            yield pickle.load(f)
+                        except EOFError:
+                            break
+                else:
+                    for line in f:
+                        result = json.loads(line)
+                        if expected_keys ^ set(result.keys()):
+                            raise Exception(f"invalid Whittler export file {fname} ... the keys in the result:\n"+\
+                                            f"{result}\ndid not match the attributes in the file's header:\n"+\
+                                            f"{header['attributes']}")
+                        yield result
+        self.resultstore.reserve(header["records"])
+        return result_gen(), header["records"], pickle_import
+
+    # Gives (results, results_len, pickle_import) for an export written before exports had a header, whose format can
+    # only be found out by trying to decode it.
+    def _give_headerless_export_results(self,fname):
+        pickle_import = False
+        try:
+            with gzip.GzipFile(fname, "rb") as f:
+                pickle.load(f)
+            def result_gen():
+                with gzip.GzipFile(fname, "rb") as f:
+                    while True:
+                        try:
+                            yield pickle.load(f)
+                        except EOFError:
+                            break
+            results = result_gen()
+            results_len = None
+            pickle_import = True
+        except pickle.UnpicklingError:
+            try:
+                with gzip.GzipFile(fname, "rb") as f:
+                    results = json.loads(f.read().decode('utf-8'))
+                    results_len = len(results)
+            except json.decoder.JSONDecodeError:
+                raise Exception("Failed to import file as either binary (pickle) or JSON data.")
+        # If we're importing from JSON, we need to make sure that the data keys are compatible with the specified module
+        if not pickle_import:
+            first_result_keys = set(results[0].keys())
+            for result in results:
+                if first_result_keys ^ set(result.keys()): # check symmetric difference, basically ensure that they're equal
+                    raise Exception(f"invalid Whittler export file {fname} ... all results dicts in the JSON must have the same "+\
+                                    f"set of keys, but the keys in the result:\n{result}\ndid not match the expected keys:\n"+\
+                                    f"{first_result_keys}")
+            if not isinstance(self.result_class.ATTRIBUTES, list):
+                self.result_class.ATTRIBUTES = []
+            attrs = self.result_class.ATTRIBUTES
+            for key in results[0].keys(): # don't use first_result_keys because the json is ordered whereas sets are not
+                if key not in attrs:
+                    attrs.append(key)
+        return results, results_len, pickle_import
+
+    # Loads the results in a snapshot written by write_snapshot. Into an empty database, the snapshot's columns are
+    # used straight from the memory-mapped file (see ResultStore.adopt), so there's no per-result work at all, other
+    # than adding the digests to hash_cache. Otherwise, its values are encoded into the store's dictionaries once per
+    # distinct value, and its rows are appended column by column, leaving out the results that are already in
+    # hash_cache. Only databases that don't use columnar storage and already have results in them fall back to
+    # adding the snapshot's results one by one.
+    def parse_from_snapshot(self,fname,hash_cache=None):
+        importing_str = f"IMPORTING {os.path.basename(fname)} ... "
+        start = time.time()
+        wprint(f"{importing_str}", end='\r')
+        snapshot = Snapshot(fname)
+        if snapshot.module != self.result_class.FRIENDLY_NAME:
+            raise Exception(f"{fname} is a snapshot of {snapshot.module} results, which can't be loaded with the "+\
+                            f"{self.result_class.FRIENDLY_NAME} module.")
+        self.result_class._add_whittler_attributes()
+        for attr in (*snapshot.attributes, *snapshot.columns()):
+            if attr not in self.result_class.ATTRIBUTES:
+                self.result_class.ATTRIBUTES.append(attr)
+        store = self.resultstore
+        columns = snapshot.columns()
+        relevance = snapshot.section("relevance")
+        digests = snapshot.section("digests")
+        if not len(store):
+            store.adopt(columns, snapshot.dictionaries(), relevance, digests, postings=snapshot.postings())
+            first_ordinal = 0
+            if not hash_cache is None:
+                hash_cache.update(zip(digests.tolist(), range(len(digests))))
+        elif store.columnar:
+            columns = self._encode_snapshot_columns(columns, snapshot.dictionaries())
+            keep = self._new_row_mask(columns, digests, hash_cache)
+            first_ordinal = store.extend_columns({attr:codes[keep] for attr,codes in columns.items()},
+                                                 relevance[keep], digests[keep])
+        else:
+            dictionaries = snapshot.dictionaries()
+            from_stored_values = self.result_class._from_stored_values
+            pending_results = []
+            for ordinal, digest in enumerate(digests.tolist()):
+                result = from_stored_values({attr:dictionaries[attr].decode(codes[ordinal])
+                                             for attr,codes in columns.items() if codes[ordinal] != MISSING}, digest)
+                result._relevant = bool(relevance[ordinal])
+                pending_results.append(result)
+                if len(pending_results) >= self.RESULTS_PER_INSERT:
+                    self.add_results(pending_results, lookup_dict=hash_cache)
+                    pending_results = []
+            self.add_results(pending_results, lookup_dict=hash_cache)
+            first_ordinal = None
+        if not first_ordinal is None:
+            ordinals = np.arange(first_ordinal, len(store), dtype=np.uint32)
+            self.results.extend_ordinals(ordinals)
+            for resultdict in self.categorized_results.indexed_resultdicts:
+                resultdict.add_ordinals(ordinals)
+        tot_time = "{:.2f}".format(time.time()-start)
+        done_str = f"{importing_str}Done (took {tot_time}s)"
+        wprint(done_str+" "*max(0,Config.MAX_OUTPUT_WIDTH-len(done_str)))
+
+    # Translates the codes in a snapshot's columns into codes in the store's own dictionaries, encoding each distinct
+    # value once.
+    def _encode_snapshot_columns(self, columns, dictionaries):
+        ret = {}
+        for attr, codes in columns.items():
+            self.resultstore.column(attr)
+            encode = self.resultstore.dictionaries[attr].encode
+            dictionary = dictionaries[attr]
+            # The extra entry at the end maps MISSING to itself.
+            code_map = np.fromiter((encode(dictionary.decode(code)) for code in range(len(dictionary))),
+                                   dtype=np.uint32, count=len(dictionary))
+            code_map = np.append(code_map, MISSING).astype(np.uint32)
+            ret[attr] = code_map[np.minimum(codes, len(dictionary))]
+        return ret
+
+    # Like _drop_known_results, but for rows given column by column, with codes in the store's dictionaries. Rows are
+    # the same if all their codes are. Gives a mask of the rows to keep.
+    def _new_row_mask(self, columns, digests, lookup_dict):
+        keep = np.ones(len(digests), dtype=np.bool_)
+        if lookup_dict is None:
+            return keep
+        store = self.resultstore
+        first_ordinal = len(store)
+        attrs = list(store.columns)
+        kept = []
+        def row_codes(i):
+            return tuple(int(columns[attr][i]) if attr in columns else MISSING for attr in attrs)
+        for i, digest in enumerate(digests.tolist()):
+            ordinal = lookup_dict.get(digest)
+            if ordinal is None:
+                lookup_dict[digest] = first_ordinal+len(kept)
+            else:
+                if ordinal < first_ordinal:
+                    known_codes = tuple(int(store.code(ordinal, attr)) for attr in attrs)
+                else:
+                    known_codes = row_codes(kept[ordinal-first_ordinal])
+                if known_codes == row_codes(i):
+                    keep[i] = False
+                    continue
+            kept.append(i)
+        return keep
+
+    # Writes the whole database, including its irrelevant results and the posting lists of its categorized indexes,
+    # to a snapshot that parse_from_export can load back in seconds, however many results there are (see Snapshot).
+    def write_snapshot(self,fname):
+        Snapshot.write(fname, self)
+
+
     #######################################
     #  RelevanceInterface implementations
     #
     
     def real_iter_values(self):
         yield from self.results.real_iter_values()
+
+    def real_ordinals(self):
+        return np.arange(len(self.resultstore), dtype=np.uint32)
     
 
     #################################################
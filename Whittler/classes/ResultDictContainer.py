@@ -1,16 +1,20 @@
 from Whittler.classes.RelevanceInterface import RelevanceInterface
 from Whittler.classes.RelevanceFilteredResultList import RelevanceFilteredResultList
 from Whittler.classes.MemoryCompressor import MaybeCompressedString
+from Whittler.classes.GrowableArray import GrowableArray
+from Whittler.classes.ResultStore import MISSING
 from collections import defaultdict, OrderedDict, namedtuple
+import numpy as np
 import re
 
 
 class SortedResultListDict(defaultdict, RelevanceInterface):
 
-    def __init__(self, default_type, pointer_to_me=None):
+    def __init__(self, default_type, pointer_to_me=None, resultstore=None):
         defaultdict.__init__(self, default_type)
         RelevanceInterface.__init__(self, pointer_to_me)
         self._pointer_to_me = pointer_to_me
+        self.resultstore = resultstore
     
     ChildView = namedtuple("ChildView",[
         "child_key_abridged",
@@ -89,6 +93,10 @@ class SortedResultListDict(defaultdict, RelevanceInterface):
 
     def __len__(self):
         return len([obj for obj in defaultdict.values(self) if obj.relevant])
+
+    @property
+    def relevant(self):
+        return any(obj.relevant for obj in defaultdict.values(self))
     
 
     #######################################
@@ -158,13 +166,253 @@ class SortedResultListDict(defaultdict, RelevanceInterface):
                 yield from value.exportjson()
     
 
+# Splits the ordinals into runs that share the same value code, and yields each code along with its run of ordinals.
+# The ordinals within each run stay in the order they were given in.
+def split_by_code(ordinals, codes):
+    order = np.argsort(codes, kind="stable")
+    ordinals, codes = ordinals[order], codes[order]
+    run_starts = np.flatnonzero(np.diff(codes)) + 1
+    for start, end in zip(np.concatenate(([0], run_starts)), np.concatenate((run_starts, [len(codes)]))):
+        if start < end:
+            yield int(codes[start]), ordinals[start:end]
+
+
+# A ResultDict sorts results into buckets by attribute value, and keeps the total and relevant result counts of
+# every bucket up to date as results are added and marked, so that showing it costs one step per bucket rather than
+# one per result.
+#
+# Categorized ResultDicts (see ResultDatabase.categorized_results) are built over a single attribute, and identify
+# each bucket by the code of its value in the ResultStore. Result groups (see ResultDatabase.grouped_results) can hold
+# any set of results, keyed by whatever value they were grouped by, and keep track of which bucket each result is in
+# themselves - a result can be in only one bucket of a given group.
+#
+# Categorized ResultDicts are indexed lazily, since most attributes (especially the flattened ones that some modules
+# produce by the hundreds) are never looked at. No result is sorted into a bucket until the index is first needed,
+# i.e. when the ResultDict is navigated into, displayed or filtered. Until then, its summary stats are computed
+# straight from the attribute's column in the ResultStore. Once built, the index is kept up to date by
+# ResultDatabase.add_results.
 class ResultDict(SortedResultListDict):
-    def __init__(self, parent_rdc=None, pointer_to_me=None):
-        SortedResultListDict.__init__(self, default_type=RelevanceFilteredResultList, pointer_to_me=pointer_to_me)
+    def __init__(self, parent_rdc=None, pointer_to_me=None, resultstore=None, attrname=None):
+        SortedResultListDict.__init__(self, default_type=None, pointer_to_me=pointer_to_me, resultstore=resultstore)
         self.parent_rdc = parent_rdc
+        self.attrname = attrname
+        self._relevant_count = 0
+        # The relevant result count of each bucket, indexed by bucket id. The buckets read their counts from here.
+        self._bucket_relevant_counts = GrowableArray(np.int64)
+        self._bucket_ids_by_key = {}
+        if attrname is None:
+            # The id of the bucket holding each result in this group (indexed by ordinal), or -1 if it isn't in it.
+            self._group_bucket_ids = GrowableArray(np.int64, fill_value=-1)
+            self.indexed = True
+            resultstore.add_relevance_listener(self._relevance_changed)
+        else:
+            self.indexed = False
+            self._summary_stats = None
+
+    def build_index(self):
+        if self.indexed:
+            return
+        self.indexed = True
+        store = self.resultstore
+        column = store.columns.get(self.attrname)
+        if not column is None:
+            column = column.view()
+            ordinals = np.flatnonzero(column != MISSING).astype(np.uint32)
+            self._bucket_relevant_counts.pad_to(len(store.dictionaries[self.attrname]))
+            relevant_counts = np.bincount(column[ordinals[store.relevance.view()[ordinals]]],
+                                          minlength=len(self._bucket_relevant_counts))
+            self._bucket_relevant_counts[:] = relevant_counts
+            self._relevant_count = int(relevant_counts.sum())
+            dictionary = store.dictionaries[self.attrname]
+            postings = store.postings.get(self.attrname)
+            if not postings is None and postings[0] == len(store):
+                # The rows were loaded from a snapshot along with their posting lists, so they're already sorted.
+                _, posting_ordinals, offsets = postings
+                for code in np.flatnonzero(offsets[1:] > offsets[:-1]).tolist():
+                    self._new_bucket(dictionary.decode(code), code).extend_ordinals(
+                        posting_ordinals[offsets[code]:offsets[code+1]])
+            else:
+                for code, bucket_ordinals in split_by_code(ordinals, column[ordinals]):
+                    self._new_bucket(dictionary.decode(code), code).extend_ordinals(bucket_ordinals)
+        store.add_relevance_listener(self._relevance_changed)
+        self.parent_rdc.indexed_resultdicts.append(self)
+
+    def _new_bucket(self, key, bucket_id):
+        bucket = RelevanceFilteredResultList(resultstore=self.resultstore)
+        bucket._bucket_owner = self
+        bucket._bucket_id = bucket_id
+        self._bucket_relevant_counts.pad_to(bucket_id+1)
+        self._bucket_ids_by_key[key] = bucket_id
+        self[key] = bucket
+        return bucket
+
+    def __missing__(self, key):
+        key = MaybeCompressedString(key)
+        if self.attrname is None:
+            bucket_id = len(self._bucket_relevant_counts)
+        else:
+            dictionary = self.resultstore.dictionaries.get(self.attrname)
+            bucket_id = None if dictionary is None else dictionary.code_of(key)
+            if bucket_id is None:
+                # No result has this value, so there's nothing to categorize under it.
+                return RelevanceFilteredResultList(resultstore=self.resultstore)
+        return self._new_bucket(key, bucket_id)
+
+    def __getitem__(self, key):
+        self.build_index()
+        return SortedResultListDict.__getitem__(self, key)
+
+    # Adds newly stored results to the buckets for their values of this ResultDict's attribute, looking up each bucket
+    # once per distinct value rather than once per result.
+    def add_ordinals(self, ordinals):
+        store = self.resultstore
+        column = store.columns.get(self.attrname)
+        if column is None:
+            return
+        codes = column.view()[ordinals]
+        ordinals, codes = ordinals[codes != MISSING], codes[codes != MISSING]
+        dictionary = store.dictionaries[self.attrname]
+        for code, bucket_ordinals in split_by_code(ordinals, codes):
+            self[dictionary.decode(code)].extend_ordinals(bucket_ordinals)
+        relevant_codes = codes[store.relevance.view()[ordinals]]
+        np.add.at(self._bucket_relevant_counts.view(), relevant_codes, 1)
+        self._relevant_count += len(relevant_codes)
+
+    # Adds the results with the given ordinals to this group, in buckets keyed by their value of attrname. Results that
+    # are already in the group stay where they are.
+    def add_group_members(self, ordinals, attrname):
+        store = self.resultstore
+        self._group_bucket_ids.pad_to(len(store))
+        ordinals = np.unique(np.asarray(ordinals, dtype=np.uint32))
+        ordinals = ordinals[self._group_bucket_ids.view()[ordinals] == -1]
+        codes = store.column(attrname).view()[ordinals]
+        ordinals, codes = ordinals[codes != MISSING], codes[codes != MISSING]
+        dictionary = store.dictionaries[attrname]
+        for code, bucket_ordinals in split_by_code(ordinals, codes):
+            bucket = self[dictionary.decode(code)]
+            bucket.merge_ordinals(bucket_ordinals)
+            self._group_bucket_ids[bucket_ordinals] = bucket._bucket_id
+        relevant_ordinals = store.filter_relevant(ordinals)
+        np.add.at(self._bucket_relevant_counts.view(), self._group_bucket_ids.view()[relevant_ordinals], 1)
+        self._relevant_count += len(relevant_ordinals)
+
+    def __delitem__(self, key):
+        self.build_index()
+        key = MaybeCompressedString(key)
+        bucket = defaultdict.__getitem__(self, key)
+        if self.attrname is None:
+            self._group_bucket_ids[bucket.real_ordinals()] = -1
+        self._relevant_count -= len(bucket)
+        self._bucket_relevant_counts[bucket._bucket_id] = 0
+        del self._bucket_ids_by_key[key]
+        defaultdict.__delitem__(self, key)
+
+    def _relevance_changed(self, ordinals, relevant):
+        if self.attrname is None:
+            group_bucket_ids = self._group_bucket_ids.view()
+            bucket_ids = group_bucket_ids[ordinals[ordinals < len(group_bucket_ids)]]
+            bucket_ids = bucket_ids[bucket_ids != -1]
+        else:
+            column = self.resultstore.columns.get(self.attrname)
+            if column is None:
+                return
+            bucket_ids = column.view()[ordinals]
+            bucket_ids = bucket_ids[bucket_ids < len(self._bucket_relevant_counts)]
+        sign = 1 if relevant else -1
+        np.add.at(self._bucket_relevant_counts.view(), bucket_ids, sign)
+        self._relevant_count += sign*len(bucket_ids)
+
+    # Gives the relevant result count and the number of values with relevant results, computed from the attribute's
+    # column for an index that hasn't been built. These are cached until the store's relevance or length changes.
+    def summary_stats(self):
+        store = self.resultstore
+        cache_key = (store.relevance_version, len(store))
+        if self._summary_stats is None or self._summary_stats[0] != cache_key:
+            column = store.columns.get(self.attrname)
+            if column is None:
+                stats = (0, 0)
+            else:
+                column = column.view()
+                relevant_codes = column[store.relevance.view() & (column != MISSING)]
+                stats = (len(relevant_codes), len(np.unique(relevant_codes)))
+            self._summary_stats = (cache_key, stats)
+        return self._summary_stats[1]
+
+    def sorted_childviews(self, objectview=None):
+        self.build_index()
+        return SortedResultListDict.sorted_childviews(self, objectview=objectview)
+
+    # The number of buckets with relevant results in them.
+    def __len__(self):
+        if not self.indexed:
+            return self.summary_stats()[1]
+        return int(np.count_nonzero(self._bucket_relevant_counts.view()))
+
+    @property
+    def relevant(self):
+        return self.relevant_length() > 0
+
+    def relevant_length(self):
+        if not self.indexed:
+            return self.summary_stats()[0]
+        return self._relevant_count
+
+    # The number of distinct values, relevant or not. Every value in the attribute's dictionary belongs to some row.
+    def real_length(self):
+        if not self.indexed:
+            dictionary = self.resultstore.dictionaries.get(self.attrname)
+            return 0 if dictionary is None else len(dictionary)
+        return defaultdict.__len__(self)
+
+    def real_ordinals(self):
+        if not self.indexed:
+            column = self.resultstore.columns.get(self.attrname)
+            if column is None:
+                return np.empty(0, dtype=np.uint32)
+            return np.flatnonzero(column.view() != MISSING).astype(np.uint32)
+        return SortedResultListDict.real_ordinals(self)
+
+    def real_iter_values(self):
+        self.build_index()
+        return SortedResultListDict.real_iter_values(self)
 
 
 class ResultDictContainer(SortedResultListDict):
-    def __init__(self, resultdb, pointer_to_me=None):
-        SortedResultListDict.__init__(self, default_type=lambda: ResultDict(parent_rdc=self), pointer_to_me=pointer_to_me)
+    def __init__(self, resultdb, pointer_to_me=None, keyed_by_attribute=False):
+        SortedResultListDict.__init__(self, default_type=None, pointer_to_me=pointer_to_me, resultstore=resultdb.resultstore)
         self.resultdb = resultdb
+        # If keyed by attribute, each key of this container is an attribute name, and its ResultDict categorizes
+        # results by that attribute's value. Otherwise, each key names a result group.
+        self.keyed_by_attribute = keyed_by_attribute
+        # The categorized ResultDicts whose index has been built, and so need to be told about new results.
+        self.indexed_resultdicts = []
+
+    def __missing__(self, key):
+        resultdict = ResultDict(parent_rdc=self, resultstore=self.resultstore,
+                                attrname=MaybeCompressedString(key).value if self.keyed_by_attribute else None)
+        self[key] = resultdict
+        return resultdict
+
+    # Makes sure there's a (possibly unindexed) ResultDict for every attribute in the store.
+    def _add_missing_attributes(self):
+        if self.keyed_by_attribute:
+            for attr in self.resultstore.columns:
+                if not defaultdict.__contains__(self, attr):
+                    self[attr]
+
+    def sorted_childviews(self, objectview=None):
+        self._add_missing_attributes()
+        return SortedResultListDict.sorted_childviews(self, objectview=objectview)
+
+    def real_iter_values(self):
+        self._add_missing_attributes()
+        return SortedResultListDict.real_iter_values(self)
+
+    def __len__(self):
+        self._add_missing_attributes()
+        return SortedResultListDict.__len__(self)
+
+    @property
+    def relevant(self):
+        self._add_missing_attributes()
+        return SortedResultListDict.relevant.fget(self)
@@ -0,0 +1,275 @@
+from Whittler.classes.GrowableArray import GrowableArray
+from Whittler.classes.MemoryCompressor import MaybeCompressedString
+from Whittler.config import ConfigurableInterface
+import numpy as np
+
+
+# The code stored for an attribute that a row does not have.
+MISSING = np.iinfo(np.uint32).max
+
+
+# Maps each distinct value of one attribute to a small integer code, and back. Each distinct value is stored
+# exactly once, no matter how many results share it.
+class ValueDictionary:
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def encode(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+    def decode(self, code):
+        return self.values[code]
+
+    # Returns None if the value has never been encoded.
+    def code_of(self, value):
+        return self._codes.get(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, value):
+        return value in self._codes
+
+
+# A ValueDictionary over values that are packed back to back as UTF-8 in a buffer, with the offset of each value (and
+# of the end of the last one) in offsets, as loaded from a Snapshot. Values are only decoded when they're first looked
+# up by code, and the dictionary is only unpacked into a regular one, with every value decoded, once values have to be
+# looked up by value (or added to it), or the values are all needed anyway.
+class PackedValueDictionary(ValueDictionary):
+    def __init__(self, attrname, data, offsets):
+        self.attrname = attrname
+        self._data = data
+        self._offsets = offsets
+        self._decoded = {}
+
+    def _unpack(self):
+        values = [self.decode(code) for code in range(len(self._offsets)-1)]
+        ValueDictionary.__init__(self)
+        for value in values:
+            ValueDictionary.encode(self, value)
+        self._decoded = None
+
+    # Only called while the values and _codes of a regular ValueDictionary don't exist yet.
+    def __getattr__(self, name):
+        if name in ("values", "_codes"):
+            self._unpack()
+            return getattr(self, name)
+        raise AttributeError(name)
+
+    def decode(self, code):
+        if self._decoded is None:
+            return self.values[code]
+        value = self._decoded.get(code)
+        if value is None:
+            start, end = int(self._offsets[code]), int(self._offsets[code+1])
+            value = MaybeCompressedString(bytes(self._data[start:end]).decode("utf-8"), self.attrname)
+            self._decoded[code] = value
+        return value
+
+    def __len__(self):
+        if self._decoded is None:
+            return len(self.values)
+        return len(self._offsets)-1
+
+
+# The storage engine behind a ResultDatabase. Every result added to the database becomes a row in the store,
+# identified by its ordinal (the order in which it was added), and every attribute in the result class' ATTRIBUTES
+# becomes a column of value codes, one per row.
+#
+# With columnar storage enabled (see Config.COLUMNAR_STORAGE), the store is the only place the attribute values
+# live, and the database hands out lightweight row views (see Result._row_view) instead of keeping the parsed
+# Result objects around. Otherwise, the store keeps the Result objects, attached to their rows. Either way, the
+# rest of the database refers to results by ordinal, and gets the result objects from give_result.
+#
+# The store also owns the relevance bitmap, which holds the relevance of every row. Marking any set of results as
+# relevant or irrelevant is a single vectorized assignment into it, and counting the relevant results in any set of
+# rows is a popcount over it. Objects that keep their own relevant counts (see ResultDict) register as relevance
+# listeners, and are told which rows changed whenever the bitmap is modified.
+class ResultStore(ConfigurableInterface):
+    def __init__(self, result_class, columnar=None):
+        self.result_class = result_class
+        self.columnar = self.Config.COLUMNAR_STORAGE if columnar is None else columnar
+        self.dictionaries = {}
+        self.columns = {}
+        # The Result objects themselves, indexed by ordinal, if not in columnar storage mode.
+        self._results = []
+        self.relevance = GrowableArray(np.bool_, fill_value=True)
+        # The digest of every row (see Result.digest).
+        self.digests = GrowableArray(np.uint64)
+        self._relevance_listeners = []
+        # Bumped whenever the relevance of any existing row changes, so that stats derived from the bitmap can be
+        # cached until it does.
+        self.relevance_version = 0
+        self._len = 0
+        # The number of rows that room has been made for (see reserve).
+        self._capacity = 0
+        # The posting list of each attribute, as (row count, ordinals, offsets), where ordinals holds the ordinals of
+        # the rows with each code, grouped by code, and the ordinals of those with code c are at offsets[c] up to
+        # offsets[c+1]. These come with rows loaded from a Snapshot, and only cover the rows there were at the time.
+        self.postings = {}
+
+    def __len__(self):
+        return self._len
+
+    def column(self, attr):
+        if attr not in self.columns:
+            # Attributes can be discovered partway through parsing (see the sarif module), in which case the rows
+            # that were stored before the attribute existed simply don't have it.
+            column = GrowableArray(np.uint32, initial_capacity=max(self._capacity, 16), fill_value=MISSING)
+            column.extend(np.full(self._len, MISSING, dtype=np.uint32))
+            self.columns[attr] = column
+            self.dictionaries[attr] = ValueDictionary()
+        return self.columns[attr]
+
+    # Makes room for count more rows, when it's known up front how many are coming (e.g. from an export's header), so
+    # that adding them doesn't copy the arrays over and over as they grow.
+    def reserve(self, count):
+        self._capacity = self._len+count
+        for array in (*self.columns.values(), self.relevance, self.digests):
+            array.reserve(self._capacity)
+
+    # Takes a standalone Result, stores its values as a new row, and returns the new row's ordinal.
+    def append(self, result):
+        ordinal = self._len
+        for attr in self.result_class.ATTRIBUTES:
+            column = self.column(attr)
+            if attr in result:
+                column.append(self.dictionaries[attr].encode(result.stored_value(attr)))
+            else:
+                column.append(MISSING)
+        self.relevance.append(result.relevant)
+        self.digests.append(result.digest)
+        if not self.columnar:
+            result._attach(self, ordinal)
+            self._results.append(result)
+        self._len += 1
+        return ordinal
+
+    # Bulk version of append, which encodes the values of all the results one attribute at a time, and returns the
+    # ordinal of the first new row.
+    def extend(self, results):
+        first_ordinal = self._len
+        for attr in self.result_class.ATTRIBUTES:
+            column = self.column(attr)
+            encode = self.dictionaries[attr].encode
+            column.extend(np.fromiter(
+                (encode(result.stored_value(attr)) if attr in result else MISSING for result in results),
+                dtype=np.uint32, count=len(results)))
+        self.relevance.extend(np.fromiter((result.relevant for result in results), dtype=np.bool_, count=len(results)))
+        self.digests.extend(np.fromiter((result.digest for result in results), dtype=np.uint64, count=len(results)))
+        if not self.columnar:
+            for ordinal, result in enumerate(results, first_ordinal):
+                result._attach(self, ordinal)
+            self._results.extend(results)
+        self._len += len(results)
+        return first_ordinal
+
+    # Takes over the rows of a Snapshot, given as its columns of codes and their dictionaries by attribute, and its
+    # relevance and digests, as the whole contents of this empty store. The arrays are used as they are, without
+    # copying them, until more rows are added after them (except the relevance, which is modified in place). The rows
+    # are only ever read through row views, so the store switches to columnar storage if it wasn't already.
+    def adopt(self, columns, dictionaries, relevance, digests, postings={}):
+        assert self._len == 0
+        self.columnar = True
+        for attr, codes in columns.items():
+            self.columns[attr] = GrowableArray.wrap(codes, fill_value=MISSING)
+            self.dictionaries[attr] = dictionaries[attr]
+        self.relevance = GrowableArray.wrap(np.array(relevance, dtype=np.bool_), fill_value=True)
+        self.digests = GrowableArray.wrap(digests)
+        self._len = len(digests)
+        for attr, column in self.columns.items():
+            column.pad_to(self._len)
+        self.postings = {attr:(self._len, *attr_postings) for attr, attr_postings in postings.items()}
+
+    # Bulk version of extend for rows that are already encoded, given as columns of codes into this store's
+    # dictionaries by attribute. Like adopted rows, they're only ever read through row views.
+    def extend_columns(self, columns, relevance, digests):
+        assert self.columnar
+        first_ordinal = self._len
+        count = len(digests)
+        for attr in columns:
+            self.column(attr)
+        for attr, column in self.columns.items():
+            column.extend(columns[attr] if attr in columns else np.full(count, MISSING, dtype=np.uint32))
+        self.relevance.extend(relevance)
+        self.digests.extend(digests)
+        self._len += count
+        return first_ordinal
+
+    def code(self, ordinal, attr):
+        column = self.columns.get(attr)
+        if column is None or ordinal >= len(column):
+            return MISSING
+        return column[ordinal]
+
+    def has_value(self, ordinal, attr):
+        return self.code(ordinal, attr) != MISSING
+
+    # Gives the stored MaybeCompressedString for this row's attribute, raising a KeyError if the row doesn't have it.
+    def value(self, ordinal, attr):
+        code = self.code(ordinal, attr)
+        if code == MISSING:
+            raise KeyError(attr)
+        return self.dictionaries[attr].decode(code)
+
+    # Takes the values of one attribute once per distinct value, and returns the ordinals of the rows whose value
+    # satisfies the predicate.
+    def ordinals_where(self, attr, predicate):
+        if not attr in self.columns:
+            return np.empty(0, dtype=np.uint32)
+        dictionary = self.dictionaries[attr]
+        matching_codes = [code for code,value in enumerate(dictionary.values) if predicate(value.value)]
+        return np.flatnonzero(np.isin(self.columns[attr].view(), matching_codes)).astype(np.uint32)
+
+    def give_row_view(self, ordinal):
+        return self.result_class._row_view(self, ordinal)
+
+    def give_result(self, ordinal):
+        if self.columnar:
+            return self.give_row_view(ordinal)
+        return self._results[ordinal]
+
+
+    #######################
+    #  Relevance bitmap
+    #
+
+    def is_relevant(self, ordinal):
+        return bool(self.relevance[ordinal])
+
+    # Marks every row in ordinals as relevant or irrelevant, and returns the ordinals of the rows whose relevance
+    # actually changed.
+    def set_relevance(self, ordinals, relevant):
+        relevance = self.relevance.view()
+        ordinals = np.asarray(ordinals, dtype=np.uint32)
+        changed = ordinals[relevance[ordinals] != relevant]
+        # Most sets of ordinals are already sorted and free of duplicates, and np.unique is comparatively slow.
+        if len(changed) > 1 and not np.all(changed[1:] > changed[:-1]):
+            changed = np.unique(changed)
+        relevance[changed] = relevant
+        if len(changed):
+            self.relevance_version += 1
+            for listener in self._relevance_listeners:
+                listener(changed, relevant)
+        return changed
+
+    # The listener is called with the array of ordinals whose relevance changed, and their new relevance.
+    def add_relevance_listener(self, listener):
+        self._relevance_listeners.append(listener)
+
+    # Counts the relevant rows among the given ordinals, or among all rows if no ordinals are given.
+    def count_relevant(self, ordinals=None):
+        relevance = self.relevance.view()
+        if ordinals is None:
+            return int(np.count_nonzero(relevance))
+        return int(np.count_nonzero(relevance[ordinals]))
+
+    # Gives only the ordinals of the relevant rows among the given ordinals.
+    def filter_relevant(self, ordinals):
+        return ordinals[self.relevance.view()[ordinals]]
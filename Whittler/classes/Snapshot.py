@@ -0,0 +1,142 @@
+from Whittler.classes.ResultStore import PackedValueDictionary, MISSING
+from Whittler.classes.Metadata import metadata_only_instance, WHITTLER_VERSION
+import numpy as np
+import json
+import mmap
+
+
+# A snapshot of a whole ResultDatabase, stored the way the ResultStore holds it in memory, so that it can be loaded
+# back by memory-mapping the file, without any per-result work: every array in it is used straight from the file.
+#
+# The file starts with MAGIC, followed by a header line of JSON, which holds the format version, Whittler's Metadata,
+# the module the results were parsed with, its attributes, and the offset, dtype and length of each section. Sections
+# are raw numpy arrays, aligned to ALIGNMENT bytes, starting at the first aligned offset after the header:
+#  - "column:<attr>", the code of each row's value of the attribute (or MISSING)
+#  - "values:<attr>" and "offsets:<attr>", the attribute's distinct values, packed back to back as UTF-8, and the
+#    offset of each of them (see PackedValueDictionary)
+#  - "relevance" and "digests", the relevance and digest of each row
+#  - "postings:<attr>" and "posting_offsets:<attr>", the ordinals of the rows with each value of the attribute, grouped
+#    by code, for the attributes whose categorized index had been built (see ResultStore.postings)
+#
+# The file has to stay unchanged for as long as the results loaded from it are in use.
+class Snapshot:
+
+    MAGIC = b"WHITTLER SNAPSHOT\n"
+    FORMAT_VERSION = 1
+    ALIGNMENT = 8
+
+    def __init__(self, fname):
+        self.fname = fname
+        with open(fname, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if not self.map[:len(self.MAGIC)] == self.MAGIC:
+            raise Exception(f"{fname} is not a Whittler snapshot.")
+        header_end = self.map.find(b"\n", len(self.MAGIC))
+        self.header = json.loads(self.map[len(self.MAGIC):header_end].decode("utf-8"))
+        if self.header["format_version"] != self.FORMAT_VERSION:
+            raise Exception(f"{fname} is a version {self.header['format_version']} snapshot, but only version "+\
+                            f"{self.FORMAT_VERSION} snapshots can be loaded.")
+        version = self.header["metadata"]["version"]
+        if version.split(".")[0] != WHITTLER_VERSION.split(".")[0]:
+            raise Exception(f"{fname} was written by Whittler {version}, which is incompatible with this version "+\
+                            f"({WHITTLER_VERSION}).")
+        self.data_start = self._aligned(header_end+1)
+
+    @staticmethod
+    def is_snapshot(fname):
+        with open(fname, "rb") as f:
+            return f.read(len(Snapshot.MAGIC)) == Snapshot.MAGIC
+
+    @classmethod
+    def _aligned(cls, offset):
+        return -(-offset//cls.ALIGNMENT)*cls.ALIGNMENT
+
+    @property
+    def module(self):
+        return self.header["module"]
+
+    @property
+    def attributes(self):
+        return self.header["attributes"]
+
+    @property
+    def row_count(self):
+        return self.header["rows"]
+
+    # Gives the section as a read-only numpy array over the memory map.
+    def section(self, name):
+        offset, dtype, count = self.header["sections"][name]
+        if not count:
+            return np.empty(0, dtype=dtype)
+        return np.frombuffer(self.map, dtype=dtype, count=count, offset=self.data_start+offset)
+
+    def columns(self):
+        return {attr:self.section(f"column:{attr}") for attr in self.header["columns"]}
+
+    def dictionaries(self):
+        return {attr:PackedValueDictionary(attr, self.section(f"values:{attr}"), self.section(f"offsets:{attr}"))
+                for attr in self.header["columns"]}
+
+    # Gives (ordinals, offsets) for each attribute that has posting lists (see ResultStore.postings).
+    def postings(self):
+        return {attr:(self.section(f"postings:{attr}"), self.section(f"posting_offsets:{attr}"))
+                for attr in self.header["postings"]}
+
+    # Writes a snapshot of the whole database (including its irrelevant results) to fname.
+    @classmethod
+    def write(cls, fname, resultdb):
+        store = resultdb.resultstore
+        row_count = len(store)
+        sections = {}
+        arrays = []
+        size = 0
+        def add_section(name, array):
+            nonlocal size
+            array = np.ascontiguousarray(array)
+            sections[name] = [size, array.dtype.str, len(array)]
+            arrays.append((size, array))
+            size = cls._aligned(size+array.nbytes)
+        columns = {}
+        for attr, column in store.columns.items():
+            column = column.view()
+            if len(column) < row_count:
+                column = np.concatenate((column, np.full(row_count-len(column), MISSING, dtype=np.uint32)))
+            columns[attr] = column
+            values = [value.value.encode("utf-8") for value in store.dictionaries[attr].values]
+            offsets = np.zeros(len(values)+1, dtype=np.uint64)
+            np.cumsum([len(value) for value in values], out=offsets[1:])
+            add_section(f"column:{attr}", column)
+            add_section(f"values:{attr}", np.frombuffer(b"".join(values), dtype=np.uint8))
+            add_section(f"offsets:{attr}", offsets)
+        add_section("relevance", store.relevance.view())
+        add_section("digests", store.digests.view())
+        # Only the indexes that were needed in this session are likely to be needed again.
+        posting_attrs = [resultdict.attrname for resultdict in resultdb.categorized_results.indexed_resultdicts
+                         if resultdict.attrname in columns]
+        for attr in posting_attrs:
+            column = columns[attr]
+            ordinals = np.flatnonzero(column != MISSING).astype(np.uint32)
+            ordinals = ordinals[np.argsort(column[ordinals], kind="stable")]
+            offsets = np.zeros(len(store.dictionaries[attr])+1, dtype=np.uint64)
+            np.cumsum(np.bincount(column[ordinals], minlength=len(offsets)-1), out=offsets[1:])
+            add_section(f"postings:{attr}", ordinals)
+            add_section(f"posting_offsets:{attr}", offsets)
+        header = {
+            "format_version": cls.FORMAT_VERSION,
+            "metadata": metadata_only_instance.exportjson(),
+            "module": resultdb.result_class.FRIENDLY_NAME,
+            "attributes": [attr for attr in resultdb.result_class.ATTRIBUTES if attr in columns],
+            "columns": list(columns),
+            "postings": posting_attrs,
+            "rows": row_count,
+            "sections": sections
+        }
+        header_bytes = cls.MAGIC+json.dumps(header).encode("utf-8")+b"\n"
+        with open(fname, "wb") as f:
+            f.write(header_bytes)
+            data_start = cls._aligned(len(header_bytes))
+            position = len(header_bytes)
+            for offset, array in arrays:
+                f.write(b"\0"*(data_start+offset-position))
+                f.write(array.data)
+                position = data_start+offset+array.nbytes
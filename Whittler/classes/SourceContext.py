@@ -0,0 +1,93 @@
+from Whittler.classes.LRUCache import LRUCache
+from Whittler.classes.Singleton import Singleton
+import numpy as np
+import mmap
+import os
+
+
+# A read-only memory map of a source file, along with the offset of the end of each of its lines, so that any range of
+# lines can be read straight out of the file without going through the lines before it.
+class SourceFile:
+    def __init__(self, path, encoding="utf-8"):
+        self.encoding = encoding
+        with open(path, "rb") as f:
+            self.size = os.fstat(f.fileno()).st_size
+            # Empty files can't be mapped, but then there are no lines to read anyway.
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        line_ends = np.flatnonzero(np.frombuffer(self.map, dtype=np.uint8) == ord("\n"))
+        if self.size and (not len(line_ends) or line_ends[-1] != self.size-1):
+            # The last line doesn't have a newline at the end.
+            line_ends = np.append(line_ends, self.size)
+        self.line_ends = line_ends
+
+    @property
+    def line_count(self):
+        return len(self.line_ends)
+
+    # The number of bytes this takes up in the SourceContext cache: the mapped file, plus its line index.
+    @property
+    def cache_size(self):
+        return self.size + self.line_ends.nbytes
+
+    # Gives the lines from first to last (1-based, both included), without their line endings. The range is clipped to
+    # the lines in the file.
+    def give_lines(self, first, last):
+        first = max(first, 1)
+        last = min(last, self.line_count)
+        if first > last:
+            return []
+        start = int(self.line_ends[first-2])+1 if first > 1 else 0
+        end = int(self.line_ends[last-1])
+        text = self.map[start:end].decode(self.encoding, errors="replace")
+        return [line[:-1] if line.endswith("\r") else line for line in text.split("\n")]
+
+
+# Gives the lines around a line of a source file, for modules whose results point at a file and line (see pssa_csv,
+# and Result.SOURCE_LOCATION_ATTRIBUTES). Each file is mapped and indexed only once, and then kept in an LRU cache
+# bounded by the total size of the files in it, so that many results pointing into the same files don't read them
+# over and over. Files bigger than the whole cache aren't read at all.
+class SourceContext(Singleton):
+
+    CACHE_BYTES = 256*2**20
+
+    def __init__(self):
+        self._files = LRUCache(max_bytes=self.CACHE_BYTES)
+
+    def configure(self, cache_bytes):
+        self._files.configure(cache_bytes)
+
+    # Gives the SourceFile for path, or None if it can't be read.
+    def give_file(self, path, encoding="utf-8"):
+        key = (os.path.abspath(path), encoding)
+        source_file = self._files.get(key)
+        if source_file is None:
+            try:
+                if os.path.getsize(key[0]) > self._files.max_bytes:
+                    return None
+                source_file = SourceFile(key[0], encoding)
+            except (OSError, ValueError):
+                return None
+            self._files.put(key, source_file, source_file.cache_size)
+        return source_file
+
+    # Gives the lines from first to last of the file (1-based, both included, and clipped to the file), or None if the
+    # file can't be read.
+    def give_lines(self, path, first, last, encoding="utf-8"):
+        source_file = self.give_file(path, encoding)
+        if source_file is None:
+            return None
+        return source_file.give_lines(first, last)
+
+    # Gives the line at lineno along with up to lines_around lines on either side of it, joined into one string, or ""
+    # if the file can't be read.
+    def give_context(self, path, lineno, lines_around, encoding="utf-8"):
+        lines = self.give_lines(path, lineno-lines_around, lineno+lines_around, encoding)
+        return "" if lines is None else "\n".join(lines)
+
+    def clear(self):
+        self._files.clear()
+
+    def stats(self):
+        return self._files.stats()
+
+SourceContextOnlyInstance = SourceContext()
@@ -0,0 +1,141 @@
+from Whittler.classes.Singleton import Singleton
+from collections import defaultdict
+import multiprocessing as mp
+import gzip
+import os
+import queue
+import signal
+import time
+
+
+def _init_worker():
+    # Ctrl-C is handled by the main process, which shuts the whole pool down.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _run_bundle(func, tasks):
+    start = time.perf_counter()
+    results = [func(task) for task in tasks]
+    return results, time.perf_counter()-start
+
+def _gzip_block(block):
+    return gzip.compress(block)
+
+
+# The process pool shared by everything that runs in parallel in a session (parsing, exporting and fuzzy grouping).
+# It's only started once it's first needed, and then kept until shutdown() is called, so that its start-up cost is only
+# paid once.
+#
+# Tasks are handed to the workers in bundles that are sized to take about BUNDLE_SECONDS each, based on how long tasks
+# of the same function have taken so far, relative to the size given for each task (e.g. the size of the file it
+# parses). That way, a few huge files get a worker each, while many tiny ones are bundled together so that the cost of
+# sending each of them to a worker doesn't dominate.
+#
+# Workers are forked from the main process when the pool starts, so they see the configuration as it was then.
+class WorkerPool(Singleton):
+
+    BUNDLE_SECONDS = 0.25
+    # How many bundles to keep queued up per worker, so that no worker sits idle waiting for its next bundle.
+    BUNDLES_IN_FLIGHT_PER_WORKER = 2
+    # The cost model before any tasks of a function have been timed: a millisecond per task plus 10 MB/s.
+    INITIAL_SECONDS_PER_TASK = 1e-3
+    INITIAL_SECONDS_PER_BYTE = 1e-7
+
+    def __init__(self):
+        self.processes = None
+        self._pool = None
+        # The cost model of each function, as [seconds per task, seconds per byte].
+        self._costs = defaultdict(lambda: [self.INITIAL_SECONDS_PER_TASK, self.INITIAL_SECONDS_PER_BYTE])
+
+    # processes=None uses one worker per CPU. Changing the number of workers restarts the pool.
+    def configure(self, processes=None, bundle_seconds=None):
+        if processes != self.processes:
+            self.shutdown()
+            self.processes = processes
+        if not bundle_seconds is None:
+            self.BUNDLE_SECONDS = bundle_seconds
+
+    # Starts the pool if it isn't running yet. Best called before starting any threads (see FileDiscovery), since
+    # forking a process while other threads are running can leave it with locks that are never released.
+    def start(self):
+        if self._pool is None:
+            self._pool = mp.Pool(self.processes, initializer=_init_worker)
+        return self._pool
+
+    @property
+    def worker_count(self):
+        return self.processes or os.cpu_count() or 1
+
+    def shutdown(self):
+        if not self._pool is None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def _estimate(self, func, size):
+        seconds_per_task, seconds_per_byte = self._costs[func]
+        return seconds_per_task + seconds_per_byte*size
+
+    # Scales the cost model of func towards what a bundle actually took, keeping its per-task to per-byte ratio.
+    def _observe(self, func, task_count, total_size, elapsed):
+        estimate = self._costs[func][0]*task_count + self._costs[func][1]*total_size
+        if estimate <= 0 or elapsed <= 0:
+            return
+        correction = (elapsed/estimate)**0.5
+        self._costs[func] = [cost*correction for cost in self._costs[func]]
+
+    # Yields func(task) for each task in sized_tasks, which gives (task, size) pairs, as the results come in. With
+    # ordered set, the results are yielded in the same order as their tasks instead.
+    def imap(self, func, sized_tasks, ordered=True):
+        pool = self.start()
+        max_in_flight = self.BUNDLES_IN_FLIGHT_PER_WORKER*self.worker_count
+        sized_tasks = iter(sized_tasks)
+        completed = queue.Queue()
+        in_flight = {}
+        finished_bundles = {}
+        next_bundle_id = 0
+        next_bundle_to_yield = 0
+        tasks_left = True
+        while tasks_left or in_flight:
+            while tasks_left and len(in_flight) < max_in_flight:
+                bundle, bundle_size, estimate = [], 0, 0
+                for task, size in sized_tasks:
+                    bundle.append(task)
+                    bundle_size += size
+                    estimate += self._estimate(func, size)
+                    if estimate >= self.BUNDLE_SECONDS:
+                        break
+                else:
+                    tasks_left = False
+                if not bundle:
+                    break
+                bundle_id = next_bundle_id
+                next_bundle_id += 1
+                in_flight[bundle_id] = (len(bundle), bundle_size)
+                pool.apply_async(_run_bundle, (func, bundle),
+                    callback=lambda ret, bundle_id=bundle_id: completed.put((bundle_id, ret, None)),
+                    error_callback=lambda e, bundle_id=bundle_id: completed.put((bundle_id, None, e)))
+            if not in_flight:
+                break
+            bundle_id, ret, error = completed.get()
+            task_count, bundle_size = in_flight.pop(bundle_id)
+            if not error is None:
+                raise error
+            results, elapsed = ret
+            self._observe(func, task_count, bundle_size, elapsed)
+            if not ordered:
+                yield from results
+                continue
+            finished_bundles[bundle_id] = results
+            while next_bundle_to_yield in finished_bundles:
+                yield from finished_bundles.pop(next_bundle_to_yield)
+                next_bundle_to_yield += 1
+
+    def imap_unordered(self, func, sized_tasks):
+        return self.imap(func, sized_tasks, ordered=False)
+
+    # Compresses each block of bytes into a gzip member of its own. Concatenated gzip members make up a valid gzip
+    # file, which reads back as the concatenation of the blocks.
+    def gzip_blocks(self, blocks):
+        return self.imap(_gzip_block, ((block, len(block)) for block in blocks))
+
+WorkerPoolOnlyInstance = WorkerPool()
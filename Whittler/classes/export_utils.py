@@ -0,0 +1,33 @@
+from Whittler.classes.Metadata import WHITTLER_VERSION
+import json
+
+
+# Exports (see the export and exportjson commands) start with EXPORT_MAGIC, followed by a line of JSON that describes
+# the rest of the file, so that imports know how to decode it, and how many results to expect, before reading any of
+# it:
+#  - "format": "pickle" for one pickled result after another, or "json" for one JSON object per line
+#  - "version": the version of Whittler that wrote the file
+#  - "module": the FRIENDLY_NAME of the module the results were parsed with
+#  - "attributes": the module's ATTRIBUTES
+#  - "records": the number of results in the file
+# Both lines are compressed along with the results. Files from before exports had a header are still imported, by
+# trying each format in turn.
+EXPORT_MAGIC = b"WHITTLER EXPORT\n"
+
+def give_export_header(export_format, result_class, record_count):
+    header = {
+        "format": export_format,
+        "version": WHITTLER_VERSION,
+        "module": result_class.FRIENDLY_NAME,
+        "attributes": list(result_class.ATTRIBUTES),
+        "records": record_count
+    }
+    return EXPORT_MAGIC+json.dumps(header).encode("utf-8")+b"\n"
+
+# Reads the header at the start of the (decompressed) file object f, leaving f right after it. If the file has no
+# header, gives None, and leaves f back at the start.
+def read_export_header(f):
+    if f.read(len(EXPORT_MAGIC)) != EXPORT_MAGIC:
+        f.seek(0)
+        return None
+    return json.loads(f.readline().decode("utf-8"))
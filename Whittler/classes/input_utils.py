@@ -8,7 +8,9 @@ from collections import Counter
 actions = {
     "general" : {
         "exit" : "Gracefully exit the program",
-        "shell" : "Drop into an IPython shell to interact with the dataset."
+        "shell" : "Drop into an IPython shell to interact with the dataset.",
+        "memstats" : "Show how many distinct attribute values are held in memory, how often values were shared, and how "+\
+                     "often compressed values were read from the decompression cache"
     },
     "navigation" : {
         "show [[limit]]" : "Show the current data context, up to [limit] entries (shows all entries by default). Mutes "+\
@@ -63,7 +65,10 @@ actions = {
         "exportjson [fname] [[id]]" : "Export all relevant results in JSON form into the gzip-compressed file [fname]. "+\
                                       "Optionally, limit the output to the result set as referenced by [id].",
         "export [fname] [[id]]" : "Export all relevant results in Python Pickle (serialized binary) form at into the gzip-compressed "+\
-                                  "file [fname]. Optionally, limit the output to the result set as referenced by [id]."
+                                  "file [fname]. Optionally, limit the output to the result set as referenced by [id].",
+        "snapshot [fname]" : "Write all results, relevant or not, along with their relevance, into the snapshot file [fname], "+\
+                             "which can be loaded back much faster than an export with --import_whittler_output, even for "+\
+                             "very large datasets. The file must not change while the results loaded from it are in use."
     }
 }
 
@@ -212,7 +217,7 @@ def group_interactive(resultdb, groupattr, groupval, max_print_count=10, max_pri
         similar_results = list(res for res,similarity in result_similarities if similarity>SIMILARITY_THRESHOLD)
         attrvals_of_similar_results = Counter()
         for res in similar_results:
-            attrval = dict.__getitem__(res,groupattr)
+            attrval = res.stored_value(groupattr)
             attrvals_of_similar_results[attrval] += 1
         ordered_attrvals_of_similar_results = attrvals_of_similar_results.most_common()[:max_print_count]
         for attrval_mcs,count in ordered_attrvals_of_similar_results:
@@ -259,7 +264,7 @@ def group_interactive(resultdb, groupattr, groupval, max_print_count=10, max_pri
             max_print_count *= 2
             max_print_chars_per_attrval *= 2
             continue
-        resultdb.register_grouped_results(groupattr, groupval, similar_results)
+        resultdb.register_grouped_results(groupattr, groupval, [res._ordinal for res in similar_results])
         wprint("Created result group based on this entry. You can view this group in the \"groups\" pane in the top context.")
         wprint("(You might have to use the \"showall\" command, since all results in this group are now marked irrelevant.)")
         ptr = NestedObjectPointer(resultdb)
@@ -439,10 +444,9 @@ def play_elimination_game(resultdb, obj):
                     wprint(f"Sorry, that is not a case-insensitive substring of this result's \"{problematic_attr}\" attribute...")
                     continue
                 irrelevant_resultlist = resultdb.categorized_results[problematic_attr][random_result[problematic_attr]]
-                for result in resultdb.results:
-                    if substring.lower() in result[problematic_attr].lower():
-                        result.mark_irrelevant()
-                        num_results_eliminated += 1
+                matching_ordinals = resultdb.find_matching_ordinals(problematic_attr,
+                                                                    lambda value: substring.lower() in value.lower())
+                num_results_eliminated += len(resultdb.resultstore.set_relevance(matching_ordinals, False))
             elif answer == 3:
                 group_ptr = group_interactive(resultdb, problematic_attr, random_result[problematic_attr])
                 if group_ptr is None:
@@ -0,0 +1,131 @@
+# Flattens a JSON object into a single-level dict, in a single iterative pass, so that neither deeply nested objects
+# nor objects with many keys slow it down. Flattened keys are the path to each value, joined by dots:
+#  - the key of an object inside an object gets the 1-based position of the enclosing object in its list appended
+#    (or, for the objects that come after a list in the same enclosing object, one past that list's length), so that
+#    e.g. the "physicalLocation" objects of a result's locations become "locations.physicalLocation1",
+#    "locations.physicalLocation2", and so on
+#  - values inside the objects of a list all share their list's path, so later list entries overwrite earlier ones
+#  - non-object list entries are stringified, and stored under the path of the list itself
+#  - empty lists and empty objects are dropped
+# Each path prefix is joined only once, when its object or list is entered, rather than once per value under it.
+#
+# If out is given, the flattened values are added to it, and it's returned.
+def flatten_json(js, out=None):
+    if out is None:
+        out = {}
+    if not isinstance(js, dict):
+        out[""] = str(js)
+        return out
+    # Each frame is [is_list, iterator over its entries, path prefix (None at the top), position counter, parent frame].
+    # For objects, the position counter is the suffix given to the keys of the objects in it, and for lists, the
+    # position of the next entry.
+    stack = [[False, iter(js.items()), None, "", None]]
+    while stack:
+        frame = stack[-1]
+        is_list, entries, path, _, parent = frame
+        if is_list:
+            for entry in entries:
+                position = frame[3]
+                frame[3] += 1
+                if isinstance(entry, dict):
+                    stack.append([False, iter(entry.items()), path, position, None])
+                    break
+                out[path] = str(entry)
+            else:
+                stack.pop()
+                # The objects that come after a list in the same object are suffixed with one past the list's length.
+                parent[3] = frame[3]
+            continue
+        for key, value in entries:
+            if isinstance(value, list):
+                stack.append([True, iter(value), key if path is None else f"{path}.{key}", 1, frame])
+                break
+            elif isinstance(value, dict):
+                key = f"{key}{frame[3]}"
+                stack.append([False, iter(value.items()), key if path is None else f"{path}.{key}", "", None])
+                break
+            out[key if path is None else f"{path}.{key}"] = value
+        else:
+            stack.pop()
+    return out
+
+# Compiles a field map (see Result.FIELD_MAP) into a function extract(obj, parents) that gives the dict of the value at
+# the path of each attribute, by attribute, in the field map's order. Paths are dotted lists of keys into obj, e.g.
+# "extra.metadata.CWE", and each leading "^" goes up one enclosing object instead, in parents (as given by
+# IncrementalJSONReader.iter_path), e.g. "^Target" is the Target of the innermost object that obj is in.
+#
+# A path can be given as a (path, default) tuple, in which case the default is used if the value isn't there. Values
+# without a default are required, and an exception naming the missing field is raised when they're missing.
+#
+# The function is generated as Python source and compiled once, so that extracting each object is just a dict
+# display of direct lookups, with no per-field loops or calls. Its parent_keys attribute gives the keys it reads from
+# each enclosing object, innermost first (empty if it doesn't look at parents at all), the way
+# IncrementalJSONReader.iter_path takes them, so that elements only have to be held back until those are known.
+def compile_field_extractor(field_map):
+    parent_keys = []
+    body = []
+    entries = []
+    defaults = {}
+    for i, (attr, spec) in enumerate(field_map.items()):
+        path, has_default = (spec[0], True) if isinstance(spec, tuple) else (spec, False)
+        levels_up, keys = _split_field_path(path)
+        base = "obj" if levels_up == 0 else f"parents[-{levels_up}]"
+        if levels_up > 0:
+            while len(parent_keys) < levels_up:
+                parent_keys.append(set())
+            parent_keys[levels_up-1].add(keys[0])
+        lookup = base+"".join(f"[{key!r}]" for key in keys)
+        if not has_default:
+            entries.append(f"{attr!r}: {lookup}")
+            continue
+        defaults[f"default{i}"] = spec[1]
+        if len(keys) == 1:
+            entries.append(f"{attr!r}: {base}.get({keys[0]!r}, default{i})")
+            continue
+        # Anything along the way may be missing, or not be an object at all.
+        body += [f"    try:",
+                 f"        value{i} = {lookup}",
+                 f"    except (KeyError, IndexError, TypeError):",
+                 f"        value{i} = default{i}"]
+        entries.append(f"{attr!r}: value{i}")
+    # Only once a lookup has failed are the required fields gone through again, to find the one that's missing.
+    source = "\n".join(["def extract(obj, parents=()):"]+body+[
+        "    try:",
+        "        return {"+", ".join(entries)+"}",
+        "    except (KeyError, IndexError, TypeError):",
+        "        error = missing_field_error(obj, parents)",
+        "        if error is None:",
+        "            raise",
+        "        raise error from None"])
+    namespace = dict(defaults)
+    namespace["missing_field_error"] = lambda obj, parents: _missing_field_error(field_map, obj, parents)
+    exec(source, namespace)
+    extract = namespace["extract"]
+    extract.parent_keys = parent_keys
+    return extract
+
+# Gives the number of leading "^" in a field path, and the keys after them.
+def _split_field_path(path):
+    levels_up = len(path)-len(path.lstrip("^"))
+    return levels_up, path[levels_up:].split(".")
+
+# Gives an exception naming the first required field of the field map that obj (or its parents) doesn't have, or None
+# if they have all of them.
+def _missing_field_error(field_map, obj, parents):
+    for attr, path in field_map.items():
+        if isinstance(path, tuple):
+            continue
+        levels_up, keys = _split_field_path(path)
+        try:
+            value = obj if levels_up == 0 else parents[-levels_up]
+            for key in keys:
+                value = value[key]
+        except (KeyError, IndexError, TypeError):
+            if levels_up == 0:
+                where = "the result"
+            elif levels_up == 1:
+                where = "the object enclosing the result"
+            else:
+                where = f"the object {levels_up} levels up from the result"
+            return Exception(f"The required field {attr!r} (at {path!r}) is missing from {where}.")
+    return None
@@ -1,4 +1,6 @@
-from Whittler.classes.MemoryCompressor import MemoryCompressorOnlyInstance
+from Whittler.classes.MemoryCompressor import MemoryCompressorOnlyInstance, MCSInternTable, MCSDecompressionCache
+from Whittler.classes.WorkerPool import WorkerPoolOnlyInstance
+from Whittler.classes.SourceContext import SourceContextOnlyInstance
 
 class Config:
     # The encoding of the files that will be parsed by Whittler.
@@ -33,15 +35,81 @@ class Config:
     # cost of some performance.
     MEMORY_COMPRESSION = False
 
+    # "zdict" compresses each value on its own against a dictionary built from a sample of the first values parsed,
+    # which keeps decompression cheap. "stream" is the original compression scheme (see MemoryCompressor). With
+    # MEMORY_COMPRESSION_PER_ATTRIBUTE, zdict mode builds a separate dictionary for the values of each attribute.
+    MEMORY_COMPRESSION_MODE = "zdict"
+    MEMORY_COMPRESSION_PER_ATTRIBUTE = False
+
+    # With memory compression enabled, the most recently read values are kept decompressed in a cache of up to this
+    # many bytes, so that repeatedly scanning or showing the same values doesn't decompress them over and over.
+    DECOMPRESSION_CACHE_BYTES = 32*2**20
+
+    # Columnar storage keeps each distinct value of each attribute only once, and turns results into lightweight
+    # views over rows of integer codes. This greatly reduces the memory used per result on very large datasets.
+    COLUMNAR_STORAGE = False
+
+    # Each distinct attribute value is kept in memory only once, and shared between the results that have it. With weak
+    # references, a value is forgotten as soon as no result uses it anymore, at some cost to parsing speed. Otherwise,
+    # up to INTERN_TABLE_MAX_SIZE values (or all of them, if it's None) are kept around for sharing, even after their
+    # results are gone.
+    INTERN_WEAK_REFERENCES = False
+    INTERN_TABLE_MAX_SIZE = 1000000
+
+    # Multiprocessing speeds up parsing, exporting and grouping by similarity on multi-core machines.
+    MULTIPROCESSING = False
+
+    # With multiprocessing enabled, files bigger than twice this many bytes are split into chunks of about this size,
+    # which are parsed in parallel, for the modules that support it (see Result.RECORD_BOUNDARY).
+    PARALLEL_PARSE_CHUNK_BYTES = 64*2**20
+
+    # With multiprocessing enabled, parsing, exporting and fuzzy grouping are run by a pool of this many worker
+    # processes (or one per CPU, if it's None), which is started once and shared for the whole session. Work is handed
+    # to the workers in bundles that are sized to take about WORKER_BUNDLE_SECONDS each (see WorkerPool).
+    WORKER_PROCESSES = None
+    WORKER_BUNDLE_SECONDS = 0.25
+
+    # Directories are scanned for files to parse by this many threads at once. The files found are parsed in windows
+    # of up to DISCOVERY_WINDOW_SIZE files, largest first (see FileDiscovery).
+    DISCOVERY_THREADS = 8
+    DISCOVERY_WINDOW_SIZE = 1000
+
+    # Memory-mapping plaintext files keeps only the position of each distinct line in memory, and reads the lines
+    # themselves from the file whenever they're needed (see MappedString). The files must not change while loaded.
+    MEMORY_MAP_PLAINTEXT = False
+
+    # Modules whose results point at a line of a source file (see Result.SOURCE_LOCATION_ATTRIBUTES) add the lines
+    # around it to each result as its "source_context", with this many lines on either side, if it isn't None. Source
+    # files are read through a cache of up to SOURCE_CONTEXT_CACHE_BYTES worth of files (see SourceContext), which the
+    # pssa_csv module also reads its FullLine and FullLineContext from.
+    SOURCE_CONTEXT_LINES = None
+    SOURCE_CONTEXT_CACHE_BYTES = 256*2**20
+
+    # Caching parsed files keeps the results parsed from each file in the .whittler folder in your home directory, so
+    # that files that haven't changed since the last time they were parsed are loaded from there instead.
+    PARSED_FILE_CACHE = False
+
 
     ##################
 
     MemoryCompressor = MemoryCompressorOnlyInstance
+    InternTable = MCSInternTable
+    DecompressionCache = MCSDecompressionCache
+    WorkerPool = WorkerPoolOnlyInstance
+    SourceContext = SourceContextOnlyInstance
 
     def __getstate__(self):
         state = self.__dict__.copy()
         if "MemoryCompressor" in state:
             del state["MemoryCompressor"]
+        if "InternTable" in state:
+            del state["InternTable"]
+        if "DecompressionCache" in state:
+            del state["DecompressionCache"]
+        if "WorkerPool" in state:
+            del state["WorkerPool"]
+        if "SourceContext" in state:
+            del state["SourceContext"]
         return state
     
     def __setstate__(self, state):
@@ -19,6 +19,20 @@ class SampleResult(Result):
         "phone number"
     ]
 
+    # # Also optional: when parsing a directory (which is searched recursively), only the files matching one of these
+    # # glob patterns, and none of the excluded ones, are parsed. Patterns containing a "/" are matched against the path
+    # # relative to the directory, and the others against the file or directory name. Excluded directories are skipped
+    # # entirely. By default, every file is parsed.
+    # FILE_INCLUDE_GLOBS = ["*.json"]
+    # FILE_EXCLUDE_GLOBS = [".git", "node_modules"]
+
+    # # Attributes that many results share (e.g. the description of the rule each finding breaks) can be stored once per
+    # # distinct key rather than once per result. Results then read them from the row that add_joined_row added for
+    # # their values of JOIN_KEY_ATTRIBUTES, as if they were their own (see the sarif module). The joined attributes still
+    # # have to be listed in ATTRIBUTES, and the rows added before the results that use them are returned.
+    # JOIN_KEY_ATTRIBUTES = ["rule_id"]
+    # JOINED_ROWS = {}
+
     # This method (which must be declared as a staticmethod as below) is expected to take a filename, and return a list
     # of dicts, each of which will be casted to an object of this class' type (in this case, SampleResult). These dicts
     # MUST have a string as both a key and as a value - I hope to allow recursively nested structures in the future, but
@@ -42,4 +56,28 @@ class SampleResult(Result):
             # This import should be at the top, but I didn't want to complicate the imports in the example module.
             import json
             output = json.loads(f.read())
-            return output["people"]
\ No newline at end of file
+            return output["people"]
+
+    # # Instead of give_result_dict_list, you can implement give_result_dict_iter (also as a staticmethod), as a
+    # # generator that yields the same dicts one at a time. Whittler adds each result as soon as it's yielded, so the
+    # # whole file never has to be held in memory as one big list. If you open the file with open_for_parsing (which
+    # # takes the same arguments as open), Whittler can also report how far into the file parsing has gotten.
+    # @staticmethod
+    # def give_result_dict_iter(fname):
+    #     with SampleResult.open_for_parsing(fname, "r") as f:
+    #         for line in f:
+    #             full_name, address, phone_number = line.rstrip("\n").split("\t")
+    #             yield {"full name" : full_name, "address" : address, "phone number" : phone_number}
+
+    # # For tools that output JSON, you can just say where each attribute is found instead of implementing either of
+    # # the above. JSON_RESULTS_PATH is the path to the array of results in the file ("[]" for the top-level array, or
+    # # e.g. "people[]", or "groups[].people[]" for every person in every group), and FIELD_MAP maps each attribute to
+    # # the dotted path of its value in each result, or to a (path, default) tuple for values that may be missing. A
+    # # leading "^" in a path goes up to the enclosing object (e.g. "^name" for the name of the group). ATTRIBUTES can
+    # # then be left out, as it defaults to the attributes in FIELD_MAP.
+    # JSON_RESULTS_PATH = "people[]"
+    # FIELD_MAP = {
+    #     "full name" : "name.full",
+    #     "address" : ("contact.address", ""),
+    #     "phone number" : ("contact.phone", "")
+    # }
@@ -1,6 +1,5 @@
 from Whittler.classes.Result import Result
 from Whittler.config import Config
-import json
 
 class BanditResult(Result):
 
@@ -21,8 +20,9 @@ class BanditResult(Result):
       "test_name",
     ]
 
+    SOURCE_LOCATION_ATTRIBUTES = ("filename", "line_number")
+
     @staticmethod
-    def give_result_dict_list(fname):
-        with open(fname,"r", encoding=BanditResult.Config.FILE_ENCODING) as f:
-            output = json.loads(f.read())
-            return output["results"]
\ No newline at end of file
+    def give_result_dict_iter(fname):
+        for result in BanditResult.iter_json_path(fname, "results[]", encoding=BanditResult.Config.FILE_ENCODING):
+            yield BanditResult.add_source_context(result)
\ No newline at end of file
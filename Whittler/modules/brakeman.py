@@ -1,31 +1,20 @@
 from Whittler.classes.Result import Result
-import json
 
 
 class BrakemanResult(Result):
     FRIENDLY_NAME = "brakeman"
 
-    ATTRIBUTES = [
-        "warning_type",
-        "warning_code",
-        "check_name",
-        "message",
-        "file",
-        "line",
-        "link",
-        "code",
-        "user_input",
-        "confidence"
-    ]
+    JSON_RESULTS_PATH = "warnings[]"
 
-    @staticmethod
-    def give_result_dict_list(fname):
-        with open(fname, "r") as f:
-            results = []
-            output = json.loads(f.read())
-            for raw_result in output["warnings"]:
-                result = {}
-                for key in BrakemanResult.ATTRIBUTES:
-                    result[key] = raw_result[key]
-                results.append(result)
-        return results
+    FIELD_MAP = {
+        "warning_type": "warning_type",
+        "warning_code": "warning_code",
+        "check_name": "check_name",
+        "message": "message",
+        "file": "file",
+        "line": "line",
+        "link": "link",
+        "code": "code",
+        "user_input": "user_input",
+        "confidence": "confidence"
+    }
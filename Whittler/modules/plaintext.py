@@ -1,4 +1,5 @@
 from Whittler.classes.Result import Result
+from Whittler.classes.MappedString import MappedString, give_mapped_file
 
 
 class PlainTextResult(Result):
@@ -10,7 +11,40 @@ class PlainTextResult(Result):
        "line length"
     ]
 
+    RECORD_BOUNDARY = rb"\n"
+
+    @staticmethod
+    def give_result_dict_iter(fname):
+        if PlainTextResult.Config.MEMORY_MAP_PLAINTEXT:
+            yield from PlainTextResult._give_mapped_line_dicts(fname)
+            return
+        with PlainTextResult.open_for_parsing(fname,"r", encoding=PlainTextResult.Config.FILE_ENCODING) as f:
+            yield from PlainTextResult._give_line_dicts(f)
+
+    @staticmethod
+    def give_result_dict_iter_range(fname, start, end):
+        if PlainTextResult.Config.MEMORY_MAP_PLAINTEXT:
+            yield from PlainTextResult._give_mapped_line_dicts(fname, start, end)
+            return
+        with PlainTextResult.open_range_for_parsing(fname, start, end, encoding=PlainTextResult.Config.FILE_ENCODING) as f:
+            yield from PlainTextResult._give_line_dicts(f)
+
+    @staticmethod
+    def _give_line_dicts(f):
+        for line in f:
+            yield {"line":line,"line length":len(line)}
+
+    # Only the offset of each line in the file is kept (see MappedString). Lines are split at "\n" only, with "\r\n"
+    # endings turned into "\n" like in text mode.
     @staticmethod
-    def give_result_dict_list(fname):
-        with open(fname,"r", encoding=PlainTextResult.Config.FILE_ENCODING) as f:
-            return [{"line":line,"line length":len(line)} for line in f.readlines()]
\ No newline at end of file
+    def _give_mapped_line_dicts(fname, start=0, end=None):
+        mapped_file = give_mapped_file(fname, PlainTextResult.Config.FILE_ENCODING)
+        file_map = mapped_file.map
+        if end is None:
+            end = len(file_map)
+        while start < end:
+            line_end = file_map.find(b"\n", start, end)
+            line_end = end if line_end == -1 else line_end+1
+            line = mapped_file.decode(file_map[start:line_end])
+            yield {"line":MappedString(mapped_file, start, line_end-start, line),"line length":len(line)}
+            start = line_end
@@ -11,32 +11,28 @@ class PSSAResult(Result):
     def give_result_dict_list(fname):
         ret = []
         with open(fname, newline='') as csvfile:
-            filecache = {}
             for row in csv.DictReader(csvfile):
                 if not PSSAResult.ATTRIBUTES:
                     for key in row.keys():
                         PSSAResult.ATTRIBUTES.append(key)
                     PSSAResult.ATTRIBUTES.append("FullLine")
                     PSSAResult.ATTRIBUTES.append("FullLineContext")
+                row["FullLine"] = ""
+                row["FullLineContext"] = ""
                 if "ScriptPath" in row and "Line" in row:
+                    # Many rows point into the same few scripts, which are only read and indexed once each, and only
+                    # the lines around each row's line are decoded (see SourceContext).
+                    path = row["ScriptPath"]
+                    source_file = PSSAResult.Config.SourceContext.give_file(path, PSSAResult.Config.FILE_ENCODING)
                     try:
-                        path = row["ScriptPath"]
-                        if path not in filecache:
-                            with open(row["ScriptPath"],"r") as f:
-                                filecache[path] = f.read()
-                        fcontent = filecache[path]
-                        flines = fcontent.splitlines()
-                        lineno = int(row["Line"])-1
-                        row["FullLine"] = flines[lineno].strip()
-                        row["FullLineContext"] = "\n".join(flines[lineno-5: lineno+5])
-                    except Exception as e:
-                        if isinstance(e, IndexError):
-                            print(f"WARNING: line number {lineno} too high for file with {len(flines)} lines: {path}")
-                        row["FullLine"] = ""
-                        row["FullLineContext"] = ""
-                else:
-                    row["FullLine"] = ""
-                    row["FullLineContext"] = ""
-                        
+                        lineno = int(row["Line"])
+                    except (TypeError, ValueError):
+                        source_file = None
+                    if not source_file is None:
+                        if 1 <= lineno <= source_file.line_count:
+                            row["FullLine"] = source_file.give_lines(lineno, lineno)[0].strip()
+                            row["FullLineContext"] = "\n".join(source_file.give_lines(lineno-5, lineno+4))
+                        else:
+                            print(f"WARNING: line number {lineno} out of range for file with {source_file.line_count} lines: {path}")
                 ret.append(row)
         return ret
\ No newline at end of file
@@ -1,5 +1,6 @@
 from Whittler.classes.Result import Result
 from Whittler.config import Config
+from Whittler.classes.json_utils import flatten_json
 import json
 from collections import defaultdict
 # try:
@@ -17,116 +18,101 @@ class SarifResult(Result):
     
     ATTRIBUTES = []
 
+    FILE_INCLUDE_GLOBS = ["*.sarif"]
+
+    JOIN_KEY_ATTRIBUTES = ["whittler_filename", "tool", "ruleId"]
+    JOINED_ROWS = {}
+
+    # Results that have regions (e.g. "locations.physicalLocation1.region") get the values in each region gathered
+    # into a single attribute, holding the region as a string. Gives the (region attribute, key within the region) of
+    # a flattened key, or None if it isn't in a region.
     @staticmethod
-    def collapse_recursive_json(js:dict,prefix=[],ct=""):
-        ret = {}
-        if not isinstance(js, dict):
-            ret[".".join(prefix)] = str(js)
-            return ret
-        for k,v in js.items():
-            if isinstance(v,list):
-                prefix.append(k)
-                ct = 1
-                for e in v:
-                    ret = {**ret,**SarifResult.collapse_recursive_json(e,ct=ct)}
-                    ct += 1
-                prefix.pop()
-            elif isinstance(v,dict):
-                prefix.append(f"{k}{ct}")
-                new_dict = SarifResult.collapse_recursive_json(v)
-                ret = {**ret,**new_dict}
-                prefix.pop()
-            else:
-                ret[".".join([*prefix,k])] = v
-        return ret
+    def _split_region_key(key):
+        if "region" not in key:
+            return None
+        klist = key.split(".")
+        i = 0
+        while "region" not in klist[i]:
+            i += 1
+        return ".".join(klist[:i+1]), ".".join(klist[i+1:])
 
     @staticmethod
-    def give_result_dict_list(fname):
+    def give_result_dict_iter(fname):
         if not fname.endswith(".sarif"):
             print(f"Warning: ignoring {fname} as its filename does not end with \".sarif\".")
-            return []
-        with open(fname,"r", encoding=SarifResult.Config.FILE_ENCODING) as f:
+            return
+        with SarifResult.open_for_parsing(fname,"r", encoding=SarifResult.Config.FILE_ENCODING) as f:
             sarif_json = json.loads(f.read())
         
-        # I'd prefer to have this be a set(), but it needs to stay ordered for convenience.
-        all_keys = []
+        # Used as an ordered set, since the attributes need to stay in the order they were first seen for convenience.
+        all_keys = {}
 
-        run = sarif_json["runs"][0]
-        
         version = sarif_json["version"]
+        if version != "2.1.0" and version != "1.0.0":
+            print(f"Warning: Unsupported SARIF version v{version}")
+            return
 
-        # Get the rules, collapsed recursively, as a list of rule dictionaries (version-dependent)
-        if version == "2.1.0":
-            rules = [SarifResult.collapse_recursive_json(rule) for rule in run["tool"]["driver"]["rules"]]
+        # Files that merge the output of several tools have one run per tool, each with its own rules.
+        rows = {}
+        results = []
+        region_keys = {}
+        for run in sarif_json["runs"]:
+            # Get the tool name and the rules, flattened, as a list of rule dictionaries (version-dependent)
+            if version == "2.1.0":
+                tool = run["tool"]["driver"].get("name", "")
+                rules = [flatten_json(rule) for rule in run["tool"]["driver"].get("rules", [])]
+            else:
+                tool = run["tool"].get("name", "")
+                rules = [flatten_json(rule) for rule in run.get("rules", {}).values()]
             
-        elif version == "1.0.0":
-            rules = [SarifResult.collapse_recursive_json(rule) for rule in run["rules"].values()]
-        else:
-            print(f"Warning: Unsupported SARIF version v{version}")
-            return []
-        
-        # Sort rules into a dict indexed by rule ID
-        rules = {rule["id"]:rule for rule in rules}
-        for rule in rules.values():
-            del rule["id"]
-        
-        # Add the union of all rule attributes into the all_keys set (prepending "rules.")
-        for r in rules.values():
-            for k in r.keys():
-                key = f"rules.{k}"
-                if key not in all_keys:
-                    all_keys.append(key)
-        
-        # get the results, collapsed recursively, as a list of result dictionaries
-        ret = [SarifResult.collapse_recursive_json(result) for result in run["results"]]
-        if version == "2.1.0" or version == "1.0.0":
-            results = []
-            for rawresult in (SarifResult.collapse_recursive_json(result) for result in ret):
-                result = {}
+            # The attributes of each rule are kept once, in a joined row keyed by the file, tool and rule ID (see
+            # JOIN_KEY_ATTRIBUTES), with "rules." prepended to each of them
+            for rule in rules:
+                row = {f"rules.{k}":v for k,v in rule.items() if k != "id"}
+                rows[(fname, tool, rule["id"])] = row
+                all_keys.update(dict.fromkeys(row))
+            
+            # Flatten the results, gathering the values of each region into a single attribute. The split of each
+            # distinct key is only worked out once.
+            for rawresult in run.get("results", []):
+                result = {"tool":tool}
                 regiondict = defaultdict(dict)
-                for k,v in rawresult.items():
-                    if "region" in k:
-                        klist = k.split(".")
-                        region_key_list = []
-                        i = 0
-                        while "region" not in klist[i]:
-                            region_key_list.append(klist[i])
-                            i += 1
-                        region_key_list.append(klist[i])
-                        region_key = ".".join(region_key_list)
-                        regiondict[region_key][".".join(klist[i+1:])] = v
-                    else:
+                for k,v in flatten_json(rawresult).items():
+                    if not k in region_keys:
+                        region_keys[k] = SarifResult._split_region_key(k)
+                    region_key = region_keys[k]
+                    if region_key is None:
                         result[k] = v
+                    else:
+                        regiondict[region_key[0]][region_key[1]] = v
                 for k,v in regiondict.items():
                     result[k] = str(dict(sorted(v.items())))
+                all_keys.update(dict.fromkeys(result))
+                # Results whose rule isn't in the run still get a (blank) joined row.
+                rows.setdefault((fname, tool, result.get("ruleId", "")), {})
                 results.append(result)
-            ret = results
-
-        # add the union of all result attributes into the all_keys set
-        for r in ret:
-            for k in r.keys():
-                if k not in all_keys:
-                    all_keys.append(k)
+        del sarif_json
         
         # set this class' ATTRIBUTES to reflect all the keys we've collected - otherwise we'll have errors
         # when casting the returned dictionaries to SarifResult objects
-        for k in all_keys:
-            if k not in SarifResult.ATTRIBUTES:
-                SarifResult.ATTRIBUTES.append(k)
+        known_attributes = set(SarifResult.ATTRIBUTES)
+        SarifResult.ATTRIBUTES.extend(k for k in all_keys if not k in known_attributes)
 
-        for r in ret:
-            # get the rule corresponding to this result
-            rule = rules[r["ruleId"]]
-            
-            # add each rule attribute to this result, prepending "rules."
-            for k,v in rule.items():
-                r[f"rules.{k}"] = v
-            
-            # If a key in ATTRIBUTES is not present, then add it as an empty string - every result dictionary
-            # returned must have every attribute specified in this class' ATTRIBUTES variable
-            for k in SarifResult.ATTRIBUTES:
+        # If a key in ATTRIBUTES is not present, then add it as an empty string - every result returned must have every
+        # attribute specified in this class' ATTRIBUTES variable, either in its result dictionary or in its joined row
+        rule_attributes = [k for k in SarifResult.ATTRIBUTES if k.startswith("rules.")]
+        result_attributes = [k for k in SarifResult.ATTRIBUTES if not k.startswith("rules.")]
+        for key, row in rows.items():
+            for k in rule_attributes:
+                if k not in row:
+                    row[k] = ""
+            SarifResult.add_joined_row(key, row)
+
+        # The results are handed out one at a time, and only padded out as they go.
+        results.reverse()
+        while results:
+            r = results.pop()
+            for k in result_attributes:
                 if k not in r:
                     r[k] = ""
-        return ret
-
-
+            yield r
@@ -1,75 +1,34 @@
 from Whittler.classes.Result import Result
-import json
 
 class TrivyResult(Result):
     FRIENDLY_NAME = "trivy-conf"
-    
-    # This is a list of all attributes that this Result object is expected to (and is able to) contain. Result objects
-    # are basically dicts with a bunch of additional functionality, so this is like a list of allowed values for the
-    # Result dict's keys.
-    ATTRIBUTES = [
-        #parent types
-        "Target",
-        "Class",
 
-        #subkeys for misconfigs
-        "Type",
-        "ID",
-        "Title",
-        "Description",
-        "Message",
-        "Namespace",
-        "Query",
-        "Resolution",
-        "Severity",
-        "PrimaryURL",
-        "References",
-        "Status",
-        "Layer"
-        "IacMetadata"
-    ]
+    # trivy writes the parent keys before the Misconfigurations of each Result, so each of them is yielded as
+    # soon as it's read. They're only held back until the Result ends if it doesn't (see IncrementalJSONReader).
+    JSON_RESULTS_PATH = "Results[].Misconfigurations[]"
 
-    @staticmethod
-    def give_result_dict_list(fname):
-        results = [] #full array of results
-        parent_keys = [ 
-        "Target",
-        "Class"
+    # Where each attribute is found in each misconfiguration. Result objects are basically dicts with a bunch of
+    # additional functionality, so these are the allowed values for the Result dict's keys (see Result.FIELD_MAP).
+    FIELD_MAP = {
+        #parent types, which may be the same for N miscs
+        "Target": "^Target",
+        "Class": "^Class",
         #removing type from parent key since misconfig type is more valuable
-        #"Type"
-        ]
+        #"Type": "^Type",
 
-        misconfiguration_keys = [
-          "Type",
-          "ID",
-          "Title",
-          "Description",
-          "Message",
-          "Namespace",
-          "Query",
-          "Resolution",
-          "Severity",
-          "PrimaryURL",
-          "References",
-          "Status",
-          "Layer"
-          "IacMetadata"
-        ]
-
-        with open(fname, "r") as f:
-            output = json.loads(f.read())
-            for raw_result in output["Results"]:
-                #one or many vulns
-                if "Misconfigurations" in raw_result:
-                    #handle 1-n miscs for a target
-                    for misc in raw_result["Misconfigurations"]:
-                        entry = {}
-                        #setup the target which may be the same for N miscs
-                        for key in parent_keys:
-                            entry[key] = raw_result[key]
-
-                        for key in misconfiguration_keys:
-                            #if for some reason the key isn't there, just add NA
-                            entry[key] = misc.get(key, "N/A")
-                        results.append(entry)
-            return results
\ No newline at end of file
+        #subkeys for misconfigs, which are just N/A if for some reason they aren't there
+        "Type": ("Type", "N/A"),
+        "ID": ("ID", "N/A"),
+        "Title": ("Title", "N/A"),
+        "Description": ("Description", "N/A"),
+        "Message": ("Message", "N/A"),
+        "Namespace": ("Namespace", "N/A"),
+        "Query": ("Query", "N/A"),
+        "Resolution": ("Resolution", "N/A"),
+        "Severity": ("Severity", "N/A"),
+        "PrimaryURL": ("PrimaryURL", "N/A"),
+        "References": ("References", "N/A"),
+        "Status": ("Status", "N/A"),
+        "Layer": ("Layer", "N/A"),
+        "IacMetadata": ("IacMetadata", "N/A")
+    }
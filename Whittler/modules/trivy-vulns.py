@@ -1,73 +1,32 @@
 from Whittler.classes.Result import Result
-import json
 
 class TrivyResult(Result):
     FRIENDLY_NAME = "trivy-vulns"
 
-    ATTRIBUTES = [
-        #parent types
-        "Target",
-        "Class",
-        "Type",
+    # trivy writes the parent keys before the Vulnerabilities of each Result, so each of them is yielded as
+    # soon as it's read. They're only held back until the Result ends if it doesn't (see IncrementalJSONReader).
+    JSON_RESULTS_PATH = "Results[].Vulnerabilities[]"
 
-        #subkeys for vulns
-        "VulnerabilityID",
-        "PkgName",
-        "InstalledVersion",
-        "FixedVersion",
-        "Layer",
-        "SeveritySource",
-        "PrimaryURL",
-        "Title",
-        "Description",
-        "Severity",
-        "CweIDs",
-        "CVSS",
-        "References",
-        "PublishedDate",
-        "LastModifiedDate"
-    ]
+    FIELD_MAP = {
+        #parent types, which may be the same for N vulns
+        "Target": "^Target",
+        "Class": "^Class",
+        "Type": "^Type",
 
-    @staticmethod
-    def give_result_dict_list(fname):
-        results = [] #full array of results
-        parent_keys = [ 
-        "Target",
-        "Class",
-        "Type"
-        ]
-        vuln_keys = [
-        "VulnerabilityID",
-        "PkgName",
-        "InstalledVersion",
-        "FixedVersion",
-        "Layer",
-        "SeveritySource",
-        "PrimaryURL",
-        "Title",
-        "Description",
-        "Severity",
-        "CweIDs",
-        "CVSS",
-        "References",
-        "PublishedDate",
-        "LastModifiedDate"
-        ]
-
-        with open(fname, "r") as f:
-            output = json.loads(f.read())
-            for raw_result in output["Results"]:
-                #one or many vulns
-                if "Vulnerabilities" in raw_result:
-                    #handle 1-n vulns for a target
-                    for vuln in raw_result["Vulnerabilities"]:
-                        entry = {}
-                        #setup the target which may be the same for N vulns
-                        for key in parent_keys:
-                            entry[key] = raw_result[key]
-
-                        for key in vuln_keys:
-                            #if for some reason the key isn't there, just add NA
-                            entry[key] = vuln.get(key, "N/A")
-                        results.append(entry)
-            return results
\ No newline at end of file
+        #subkeys for vulns, which are just N/A if for some reason they aren't there
+        "VulnerabilityID": ("VulnerabilityID", "N/A"),
+        "PkgName": ("PkgName", "N/A"),
+        "InstalledVersion": ("InstalledVersion", "N/A"),
+        "FixedVersion": ("FixedVersion", "N/A"),
+        "Layer": ("Layer", "N/A"),
+        "SeveritySource": ("SeveritySource", "N/A"),
+        "PrimaryURL": ("PrimaryURL", "N/A"),
+        "Title": ("Title", "N/A"),
+        "Description": ("Description", "N/A"),
+        "Severity": ("Severity", "N/A"),
+        "CweIDs": ("CweIDs", "N/A"),
+        "CVSS": ("CVSS", "N/A"),
+        "References": ("References", "N/A"),
+        "PublishedDate": ("PublishedDate", "N/A"),
+        "LastModifiedDate": ("LastModifiedDate", "N/A")
+    }
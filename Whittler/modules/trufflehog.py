@@ -1,7 +1,6 @@
 from Whittler.classes.Result import Result
-from charset_normalizer import from_path
-import re
-import json
+from Whittler.classes.IncrementalJSONReader import IncrementalJSONReader
+from charset_normalizer import from_bytes
 
 
 class TrufflehogResult(Result):
@@ -20,13 +19,34 @@ class TrufflehogResult(Result):
         "stringsFound"
     ]
 
+    # The end of one JSON object, where the next one begins on a new line. JSON strings can't contain raw newlines,
+    # so unlike a bare "}{", this can never match inside of a string.
+    RECORD_BOUNDARY = rb"}\s*\n\s*(?={)"
+
+    # Detecting the encoding of a whole very large file would take about as long as parsing it, so only the start of
+    # it is sampled.
+    ENCODING_SAMPLE_BYTES = 2**20
+
+    @staticmethod
+    def _detect_encoding(fname):
+        with open(fname,"rb") as f:
+            return from_bytes(f.read(TrufflehogResult.ENCODING_SAMPLE_BYTES)).best().encoding
+
+    @staticmethod
+    def give_result_dict_iter(fname):
+        encoding = TrufflehogResult._detect_encoding(fname)
+        with TrufflehogResult.open_for_parsing(fname, "r", encoding=encoding) as f:
+            yield from TrufflehogResult._iter_concatenated_json(f)
+
+    @staticmethod
+    def give_result_dict_iter_range(fname, start, end):
+        encoding = TrufflehogResult._detect_encoding(fname)
+        with TrufflehogResult.open_range_for_parsing(fname, start, end, encoding=encoding) as f:
+            yield from TrufflehogResult._iter_concatenated_json(f)
+
+    # For some reason, trufflehog just tacks together JSON objects without commas or an array to contain them,
+    # e.g. {blah:blah} {blah:blah} . They're decoded one at a time as the file is read, so that only one object (and
+    # one buffer's worth of the file) is held in memory at once.
     @staticmethod
-    def give_result_dict_list(fname):
-        encoding = from_path(fname).best().encoding
-        with open(fname,"r", encoding=encoding) as f:
-            output_raw = f.read()
-            # For some reason, trufflehog just tacks together JSON objects without commas or an array to contain them,
-            # e.g. {blah:blah} {blah:blah} . We want to turn that into [{blah:blah},{blah:blah}] .
-            output_raw = re.sub(r"}\s*{","},{",output_raw)
-            output_raw = f"[{output_raw}]"
-            return json.loads(output_raw)
+    def _iter_concatenated_json(f):
+        return IncrementalJSONReader(f).iter_values()
@@ -0,0 +1,71 @@
+from Whittler.classes.IncrementalJSONReader import IncrementalJSONReader
+import importlib
+import io
+import json
+
+import pytest
+
+TrivyResult = importlib.import_module("Whittler.modules.trivy-vulns").TrivyResult
+
+PARENT_KEYS = [{"Target", "Class", "Type"}]
+
+
+# A text file that keeps count of how much of it has been read.
+class CountingFile(io.StringIO):
+    def __init__(self, text):
+        io.StringIO.__init__(self, text)
+        self.chars_read = 0
+
+    def read(self, size=-1):
+        chunk = io.StringIO.read(self, size)
+        self.chars_read += len(chunk)
+        return chunk
+
+
+def give_vulnerabilities(count):
+    return [{"VulnerabilityID": f"CVE-2021-{i}", "PkgName": f"pkg{i}", "Severity": "HIGH", "Description": "x"*200}
+            for i in range(count)]
+
+
+def give_trivy_json(vulnerabilities, parent_keys_first):
+    parent = {"Target": "image:latest", "Class": "os-pkgs", "Type": "debian"}
+    result = {**parent, "Vulnerabilities": vulnerabilities} if parent_keys_first else \
+             {"Vulnerabilities": vulnerabilities, **parent}
+    return json.dumps({"SchemaVersion": 2, "Results": [result]})
+
+
+def test_findings_are_yielded_before_their_result_ends():
+    vulnerabilities = give_vulnerabilities(20000)
+    text = give_trivy_json(vulnerabilities, parent_keys_first=True)
+    f = CountingFile(text)
+    elements = IncrementalJSONReader(f).iter_path("Results[].Vulnerabilities[]", with_parents=True,
+                                                  parent_keys=PARENT_KEYS)
+    first, parents = next(elements)
+    assert first == vulnerabilities[0]
+    assert parents[-1] == {"Target": "image:latest", "Class": "os-pkgs", "Type": "debian"}
+    # Only the start of the single Result has been read by the time its first finding is yielded.
+    assert f.chars_read < len(text)/10
+    assert len(list(elements)) == len(vulnerabilities)-1
+
+
+@pytest.mark.parametrize("chunk_size", [7, 4096, IncrementalJSONReader.CHUNK_SIZE])
+def test_parent_keys_after_the_findings(chunk_size):
+    vulnerabilities = give_vulnerabilities(500)
+    text = give_trivy_json(vulnerabilities, parent_keys_first=False)
+    elements = list(IncrementalJSONReader(io.StringIO(text), chunk_size).iter_path(
+        "Results[].Vulnerabilities[]", with_parents=True, parent_keys=PARENT_KEYS))
+    assert [element for element, parents in elements] == vulnerabilities
+    for element, parents in elements:
+        assert parents[-1] == {"Target": "image:latest", "Class": "os-pkgs", "Type": "debian"}
+
+
+def test_trivy_module_with_parent_keys_after_the_findings(tmp_path):
+    vulnerabilities = give_vulnerabilities(50)
+    fname = tmp_path/"trivy.json"
+    fname.write_text(give_trivy_json(vulnerabilities, parent_keys_first=False))
+    resultdicts = list(TrivyResult.give_result_dict_iter(str(fname)))
+    assert [resultdict["VulnerabilityID"] for resultdict in resultdicts] == \
+           [vulnerability["VulnerabilityID"] for vulnerability in vulnerabilities]
+    for resultdict in resultdicts:
+        assert (resultdict["Target"], resultdict["Class"], resultdict["Type"]) == \
+               ("image:latest", "os-pkgs", "debian")